@@ -0,0 +1,216 @@
+"""Local JSON API of the review engine.
+
+Clients open a review session, fetch its next cards in batches and send their
+grades back in batches, which are merged into the deck with vectorized updates,
+so each round trip covers many cards. Cards are identified by their word id,
+which is kept across reloads of the glossary. Ids are 64-bit integers, which
+JavaScript numbers cannot hold exactly, so they are sent as strings. The routes
+are mounted on the Gradio server, or served on their own by the `api` command.
+Sessions left idle for too long are closed, as are the least recently used ones
+beyond a maximum number.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import numpy as np
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+from pydantic import BaseModel
+
+from components.card_store import select_languages
+from metrics import timed
+from options import COLUMN, ORDERING
+
+if TYPE_CHECKING:
+    from components.deck import Deck
+
+PREFIX = "/api/review"
+MAX_BATCH_SIZE = 10_000
+SESSION_TTL = 30 * 60  # Seconds after which an idle session is closed
+MAX_SESSIONS = 1_000  # The least recently used sessions are closed beyond this
+
+
+class SessionRequest(BaseModel):
+    """Translations are in the given languages, all of them if empty."""
+    ordering: str = ORDERING.NET_ERRORS_WEIGHTED
+    foreign_in_front: bool = False
+    languages: list[str] = []
+
+
+class GradesRequest(BaseModel):
+    """Grades as parallel lists: `errors[i]` tells whether the card with word id `cards[i]` was wrong."""
+    cards: list[str]
+    errors: list[bool]
+
+
+class ApiSession:
+    """Review session of an API client, with its own scheduler.
+    Cards are handed out in batches, and may be graded in any order.
+    """
+    def __init__(self, deck: "Deck", ordering: str, foreign_in_front: bool, languages: list[str]):
+        self.deck = deck
+        self.foreign_in_front = foreign_in_front
+        self.languages = select_languages(languages)
+        self.lock = threading.Lock()
+        self.scheduler = deck.open_session(self, ordering)
+        self.n_ok = 0
+        self.n_not_ok = 0
+
+    @timed("api.next")
+    def next(self, n: int) -> list[dict]:
+        """The next `n` cards to review, with their front, back, section and subsection."""
+        deck = self.deck
+        cards = []
+        with self.lock:
+            for row_iat in [self.scheduler.pop() for _ in range(n)]:
+                # Missing translations are NaN, which is not valid JSON
+                front = deck.get_word(row_iat, self.foreign_in_front, self.languages)
+                back = deck.get_word(row_iat, not self.foreign_in_front, self.languages)
+                s, ss = deck.get_ss(*deck.get_sss_ids(row_iat))
+                cards.append({
+                    "card": str(deck.store.parola_id[row_iat]),
+                    "front": front if isinstance(front, str) else None,
+                    "back": back if isinstance(back, str) else None,
+                    COLUMN.SECTION: s,
+                    COLUMN.SUBSECTION: ss,
+                })
+        return cards
+
+    @timed("api.grade")
+    def grade(self, word_ids: np.ndarray, is_error: np.ndarray) -> None:
+        """Grade the cards with the given word ids. Raises KeyError if any is not in the deck."""
+        with self.lock:
+            row_iats = self.deck.find_rows(word_ids)
+            if (row_iats < 0).any():
+                raise KeyError([str(word_id) for word_id in word_ids[row_iats < 0].tolist()])
+            self.deck.grade_many(row_iats, is_error)
+            for row_iat, row_is_error in zip(row_iats.tolist(), is_error.tolist()):
+                self.scheduler.grade(row_iat, row_is_error, update=True)
+            self.n_not_ok += int(is_error.sum())
+            self.n_ok += int(is_error.size - is_error.sum())
+
+    def remap(self, row_map: "np.ndarray") -> None:
+        """Cards are handed out by word id, so only the scheduler follows a reload."""
+
+    def summary(self) -> dict:
+        return {"ok": self.n_ok, "not_ok": self.n_not_ok}
+
+
+class SessionRegistry:
+    """Open sessions by id, from the least to the most recently used.
+    Sessions idle for more than `ttl` seconds are closed, as are the least recently
+    used ones beyond `max_sessions`; the deck then forgets them too.
+    """
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions: OrderedDict[str, ApiSession] = OrderedDict()
+        self.last_access: dict[str, float] = {}
+
+    def _evict(self, now: float) -> None:
+        while self.sessions:
+            session_id = next(iter(self.sessions))
+            if len(self.sessions) <= self.max_sessions and now - self.last_access[session_id] <= self.ttl:
+                break
+            del self.sessions[session_id], self.last_access[session_id]
+
+    def add(self, session: ApiSession) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self.lock:
+            self.sessions[session_id] = session
+            self.last_access[session_id] = now
+            self._evict(now)
+        return session_id
+
+    def get(self, session_id: str) -> ApiSession | None:
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                self.last_access[session_id] = now
+            return session
+
+    def pop(self, session_id: str) -> ApiSession | None:
+        with self.lock:
+            self.last_access.pop(session_id, None)
+            return self.sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+
+def create_router(deck: "Deck") -> APIRouter:
+    """Routes of the review API, with the sessions of its clients."""
+    router = APIRouter(prefix=PREFIX)
+    sessions = SessionRegistry()
+
+    def not_found(session_id: str) -> HTTPException:
+        return HTTPException(status_code=404, detail=f"Session not found: '{session_id}'")
+
+    def get_session(session_id: str) -> ApiSession:
+        session = sessions.get(session_id)
+        if session is None:
+            raise not_found(session_id)
+        return session
+
+    @router.post("/sessions")
+    def open_session(request: SessionRequest) -> dict:
+        if request.ordering not in ORDERING.ALL:
+            raise HTTPException(status_code=422, detail=f"Ordering not recognized: '{request.ordering}'")
+        unknown = [lang for lang in request.languages if lang not in COLUMN.LANGUAGES]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Languages not recognized: {unknown}")
+        session_id = sessions.add(ApiSession(deck, request.ordering, request.foreign_in_front, request.languages))
+        return {"session": session_id, "n_cards": len(deck.store)}
+
+    @router.post("/sessions/{session_id}/next")
+    def next_cards(session_id: str, n: int = Query(1, ge=1, le=MAX_BATCH_SIZE)) -> dict:
+        return {"cards": get_session(session_id).next(n)}
+
+    @router.post("/sessions/{session_id}/grades")
+    def grade_cards(session_id: str, request: GradesRequest) -> dict:
+        session = get_session(session_id)
+        try:
+            word_ids = np.array([int(card) for card in request.cards], dtype=np.int64)
+        except (ValueError, OverflowError):
+            raise HTTPException(status_code=422, detail="Cards must be word ids written as strings.") from None
+        is_error = np.asarray(request.errors, dtype=bool)
+        if word_ids.size != is_error.size:
+            raise HTTPException(status_code=422, detail="There must be one error flag per card.")
+        if word_ids.size > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_SIZE} grades per batch.")
+        try:
+            session.grade(word_ids, is_error)
+        except KeyError as e:
+            raise HTTPException(status_code=422, detail=f"Cards not in the deck: {e.args[0]}") from None
+        return session.summary()
+
+    @router.delete("/sessions/{session_id}")
+    def close_session(session_id: str) -> dict:
+        session = sessions.pop(session_id)
+        if session is None:
+            raise not_found(session_id)
+        return session.summary()
+
+    return router
+
+
+def mount_endpoints(app: FastAPI, deck: "Deck") -> None:
+    """Serve the review API from a FastAPI app, such as the one of the Gradio UI."""
+    app.include_router(create_router(deck))
+
+
+def serve(deck: "Deck", host: str, port: int) -> None:
+    """Serve the review API on its own, until interrupted."""
+    import uvicorn
+
+    app = FastAPI(title="PTILI review API")
+    mount_endpoints(app, deck)
+    uvicorn.run(app, host=host, port=port, log_level="warning")
@@ -0,0 +1,150 @@
+"""Script for grading typed answers.
+
+The acceptable answers of a card are its back, split into its translations and
+normalized like the near-duplicate forms. They are computed once per card and
+language, while the card is prefetched, so grading only compares a few short strings: an exact
+match first, then a banded edit distance which gives up as soon as the typo
+tolerance is exceeded.
+"""
+
+import re
+from typing import TYPE_CHECKING
+
+from components.card_store import ALL_LANGUAGES
+from data.dedup import ARTICLES_PATT, normalize_word
+from options import COLUMN
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+    from components.card_store import CardStore
+
+# Each language might list synonyms
+SEPARATORS_PATT = re.compile(r"\s*[,;/]\s*")
+FOREIGN_ARTICLES_PATT = re.compile(r"^(?:(?:el|la|los|las|un|una|the|a|an|to)\s+)")
+
+
+def typo_tolerance(answer: str) -> int:
+    """Edits allowed for an answer: none below 6 letters, where one typo is often
+    another word ("casa" and "cosa"), and two from 10 letters.
+    """
+    if len(answer) < 6:
+        return 0
+    if len(answer) < 10:
+        return 1
+    return 2
+
+
+def within_distance(a: str, b: str, k: int) -> bool:
+    """Whether the Levenshtein distance of `a` and `b` is at most `k`.
+    Only the diagonal band of width 2k + 1 is computed, and the computation stops
+    as soon as a whole row of the band exceeds `k`.
+    """
+    if abs(len(a) - len(b)) > k:
+        return False
+    # A common prefix and suffix cost no edits
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < min(len(a), len(b)) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b) <= k
+
+    out = k + 1
+    prev = [j if j <= k else out for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - k), min(len(b), i + k)
+        curr = [out] * (len(b) + 1)
+        if i <= k:
+            curr[0] = i
+        row_min = curr[0]
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cost = prev[j - 1] + (ca != b[j - 1])
+            if prev[j] < cost:
+                cost = prev[j] + 1
+            if curr[j - 1] < cost:
+                cost = curr[j - 1] + 1
+            if cost > k:
+                cost = out
+            elif cost < row_min:
+                row_min = cost
+            curr[j] = cost
+        if row_min > k:
+            return False
+        prev = curr
+    return prev[len(b)] <= k
+
+
+class AnswerIndex:
+    """Normalized acceptable answers of each card, computed on first use.
+    Answers are keyed by (row, column): the Italian word has a single answer,
+    while each language's translation is split into one answer per synonym, so
+    that any selection of languages shares them.
+    Each answer is kept with its characters and typo tolerance, for the fuzzy match.
+    """
+    def __init__(self, store: "CardStore"):
+        self.store = store
+        self.answers: dict[tuple[int, str], dict[str, tuple[frozenset[str], int]]] = {}
+
+    def get_column(self, row_iat: int, column: str) -> dict[str, tuple[frozenset[str], int]]:
+        """Acceptable answers of the Italian word or of a language's translation of a card."""
+        key = (row_iat, column)
+        answers = self.answers.get(key)
+        if answers is None:
+            is_foreign = column == COLUMN.ITALIAN
+            word = (self.store.italiano if is_foreign else self.store.translations[column])[row_iat]
+            if not isinstance(word, str):
+                # Missing translation
+                forms = []
+            elif is_foreign:
+                forms = [normalize_word(word)]
+            else:
+                forms = [normalize_word(part, FOREIGN_ARTICLES_PATT) for part in SEPARATORS_PATT.split(word)]
+            answers = {form: (frozenset(form), typo_tolerance(form)) for form in forms if form}
+            self.answers[key] = answers
+        return answers
+
+    def get(self, row_iat: int, is_foreign: bool, languages: tuple[str, ...]) -> dict[str, tuple[frozenset[str], int]]:
+        """Acceptable answers of a card, by normalized form. As in the card store, words
+        without a translation in the given languages accept all of theirs.
+        """
+        if is_foreign:
+            return self.get_column(row_iat, COLUMN.ITALIAN)
+        answers = {}
+        for lang in languages:
+            answers |= self.get_column(row_iat, lang)
+        if not answers and languages != ALL_LANGUAGES:
+            return self.get(row_iat, is_foreign, ALL_LANGUAGES)
+        return answers
+
+    def remap(self, row_map: "ndarray") -> None:
+        """Follow a reload of the store: answers move to their new rows, and are
+        dropped if `row_map` is -1, for removed or changed words.
+        """
+        self.answers = {
+            (int(row_map[row_iat]), column): answers
+            for (row_iat, column), answers in self.answers.items()
+            if row_map[row_iat] >= 0
+        }
+
+    def check(self, row_iat: int, is_foreign: bool, languages: tuple[str, ...], typed: str) -> bool:
+        """Whether a typed answer matches any acceptable answer, up to a few typos."""
+        answers = self.get(row_iat, is_foreign, languages)
+        typed = normalize_word(typed, ARTICLES_PATT if is_foreign else FOREIGN_ARTICLES_PATT)
+        if not typed:
+            return False
+        if typed in answers:
+            return True
+
+        typed_chars = set(typed)
+        for form, (chars, tolerance) in answers.items():
+            # Each edit adds or removes at most two distinct characters, so most answers are skipped cheaply
+            if len(typed_chars ^ chars) <= 2 * tolerance and within_distance(typed, form, tolerance):
+                return True
+        return False
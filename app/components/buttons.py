@@ -1,8 +1,8 @@
 """Module for Gradio buttons."""
 
-from gradio import Button
+from gradio import Button, State, Textbox
 
-from components.ui_funcs import feedback_click, solution_click
+from components.ui_funcs import feedback_click, prefetch_next, solution_click
 
 
 def create_feedback_buttons() -> tuple[Button, Button, Button]:
@@ -30,23 +30,30 @@ class Buttons:
     def to_list(self) -> list[Button]:
         return [self.show, self.correct, self.neutral, self.wrong]
 
-    def set_click_events(self, rc, ss_states, card) -> None:
-        row_comps = ss_states.to_list()
+    def set_click_events(self, session: State, card: Textbox) -> None:
         review_comps = self.to_list() + [card]
 
         self.show.click(
-            solution_click(rc),
+            solution_click(),
+            inputs=session,
             outputs=review_comps,
+            concurrency_limit=None,
         )
         self.correct.click(
-            feedback_click(rc, is_error=False, update=True),
-            outputs=row_comps + review_comps,
-        )
+            feedback_click(is_error=False, update=True),
+            inputs=session,
+            outputs=[session] + review_comps,
+            concurrency_limit=None,
+        ).then(prefetch_next(), inputs=session, concurrency_limit=None)
         self.neutral.click(
-            feedback_click(rc, is_error=False, update=False),
-            outputs=row_comps + review_comps,
-        )
+            feedback_click(is_error=False, update=False),
+            inputs=session,
+            outputs=[session] + review_comps,
+            concurrency_limit=None,
+        ).then(prefetch_next(), inputs=session, concurrency_limit=None)
         self.wrong.click(
-            feedback_click(rc, is_error=True, update=True),
-            outputs=row_comps + review_comps,
-        )
+            feedback_click(is_error=True, update=True),
+            inputs=session,
+            outputs=[session] + review_comps,
+            concurrency_limit=None,
+        ).then(prefetch_next(), inputs=session, concurrency_limit=None)
@@ -0,0 +1,156 @@
+"""Script for the array-backed card store."""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from options import COLUMN
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from numpy import ndarray
+    from pandas import DataFrame
+
+ALL_LANGUAGES = tuple(COLUMN.LANGUAGES)
+
+
+def select_languages(languages: "Iterable[str] | None") -> tuple[str, ...]:
+    """Selected languages in the order they are joined. No selection means all of them."""
+    assert languages is None or set(languages) <= set(ALL_LANGUAGES), f"Languages must be in {ALL_LANGUAGES}"
+    return tuple(lang for lang in ALL_LANGUAGES if lang in languages) if languages else ALL_LANGUAGES
+
+
+def concat_langs(translations: list["ndarray"]) -> "ndarray":
+    """Join the translations of each word in several languages, skipping the missing ones."""
+    joined = pd.Series(translations[0].astype(object))
+    for other in translations[1:]:
+        other = pd.Series(other.astype(object))
+        joined = joined.str.cat(other, sep=", ").fillna(joined.fillna(other))
+    return joined.to_numpy()
+
+
+def array_bytes(arr: "ndarray") -> int:
+    """Bytes used by an array, including the strings it points to."""
+    if arr.dtype == object:
+        return int(pd.Series(arr).memory_usage(deep=True, index=False))
+    if isinstance(arr.dtype, np.dtypes.StringDType):
+        # Strings of up to 15 bytes are stored inline, longer ones in the array's arena
+        lengths = np.strings.str_len(arr[~pd.isna(arr)])
+        return arr.nbytes + int(lengths[lengths > 15].sum())
+    return arr.nbytes
+
+
+class CardStore:
+    """Per-card NumPy arrays used in the review hot path.
+    The vocabulary DataFrame is only synced back at save time.
+    Translations are kept per language, and joined for each selection of languages
+    on first use.
+    If `lean`, words are kept as NumPy variable-width strings instead of
+    Python objects, and section ids as int16.
+    """
+    def __init__(self, df_vocab: "DataFrame", lean: bool = False):
+        self.lean = lean
+        self.load(df_vocab)
+
+    def load(self, df_vocab: "DataFrame") -> None:
+        """Load the arrays from the vocabulary DataFrame, replacing the current ones
+        in place, so that the sessions sharing the store see the new ones.
+        """
+        # Missing translations stay NaN, as in the DataFrame
+        self.text_dtype = np.dtypes.StringDType(na_object=np.nan) if self.lean else object
+        id_dtype = np.int16 if self.lean else np.int32
+
+        self.italiano = df_vocab[COLUMN.ITALIAN].to_numpy(dtype=self.text_dtype)
+        self.parola_id = df_vocab[COLUMN.WORD_ID].to_numpy(dtype=np.int64)
+        self.translations = {lang: df_vocab[lang].to_numpy(dtype=self.text_dtype) for lang in ALL_LANGUAGES}
+        self.joined: dict[tuple[str, ...], ndarray] = {}
+        self.sezione_id = df_vocab["sezione_id"].to_numpy(dtype=id_dtype)
+        self.sottosezione_id = df_vocab["sottosezione_id"].to_numpy(dtype=id_dtype)
+        # Only set if several glossaries were merged
+        self.glossario_id = (
+            df_vocab["glossario_id"].to_numpy(dtype=np.int16)
+            if "glossario_id" in df_vocab
+            else np.zeros(len(df_vocab), dtype=np.int16)
+        )
+
+        self.ok = df_vocab["ok"].to_numpy(dtype=np.int32)
+        self.not_ok = df_vocab["not_ok"].to_numpy(dtype=np.int32)
+        self.last_ok = df_vocab["last_ok"].to_numpy(dtype="datetime64[D]")
+        self.last_not_ok = df_vocab["last_not_ok"].to_numpy(dtype="datetime64[D]")
+
+    def __len__(self) -> int:
+        return self.italiano.size
+
+    def translation(self, languages: tuple[str, ...] = ALL_LANGUAGES) -> "ndarray":
+        """Translations of the words in the given languages, as selected by `select_languages`.
+        Words without a translation in those languages keep all of theirs.
+        """
+        joined = self.joined.get(languages)
+        if joined is None:
+            joined = concat_langs([self.translations[lang] for lang in languages])
+            if languages != ALL_LANGUAGES:
+                joined = np.where(pd.isna(joined), self.translation().astype(object), joined)
+            joined = joined.astype(self.text_dtype)
+            self.joined[languages] = joined
+        return joined
+
+    @property
+    def traduzione(self) -> "ndarray":
+        """Translations in all the languages, as searched and shown in the tables."""
+        return self.translation()
+
+    def get_word(self, row_iat: int, is_foreign: bool, languages: tuple[str, ...] = ALL_LANGUAGES) -> str:
+        return self.italiano[row_iat] if is_foreign else self.translation(languages)[row_iat]
+
+    def grade(self, row_iat: int, is_error: bool, date: "np.datetime64") -> None:
+        if is_error:
+            self.not_ok[row_iat] += 1
+            self.last_not_ok[row_iat] = date
+        else:
+            self.ok[row_iat] += 1
+            self.last_ok[row_iat] = date
+
+    def grade_many(self, row_iats: "ndarray", is_error: "ndarray", date: "np.datetime64") -> None:
+        """Grade many cards at once. A card may be graded more than once."""
+        np.add.at(self.not_ok, row_iats[is_error], 1)
+        np.add.at(self.ok, row_iats[~is_error], 1)
+        self.last_not_ok[row_iats[is_error]] = date
+        self.last_ok[row_iats[~is_error]] = date
+
+    def history_frame(self, rows: "ndarray | None" = None) -> "DataFrame":
+        """History counters as a DataFrame indexed by row, as expected by the ordering
+        functions. If `rows` is given, only those rows are included.
+        """
+        ixs = slice(None) if rows is None else rows
+        return pd.DataFrame(
+            {
+                "ok": self.ok[ixs],
+                "not_ok": self.not_ok[ixs],
+                "last_ok": self.last_ok[ixs].astype("datetime64[ns]"),
+                "last_not_ok": self.last_not_ok[ixs].astype("datetime64[ns]"),
+            },
+            index=rows,
+        )
+
+    def vocab_frame(self) -> "DataFrame":
+        """Words and their history counters as a DataFrame, as expected by `vocab_to_history`."""
+        df = self.history_frame()
+        df.insert(0, COLUMN.ITALIAN, self.italiano.astype(object))
+        df.insert(0, COLUMN.WORD_ID, self.parola_id)
+        return df
+
+    def memory_usage(self) -> dict[str, int]:
+        """Bytes used by each array, including the joined translations built so far."""
+        arrays = {name: arr for name, arr in vars(self).items() if isinstance(arr, np.ndarray)}
+        arrays |= self.translations
+        arrays |= {f"{COLUMN.TRANSLATION} ({', '.join(langs)})": arr for langs, arr in self.joined.items()}
+        return {name: array_bytes(arr) for name, arr in arrays.items()}
+
+    def sync_to_df(self, df_vocab: "DataFrame") -> None:
+        """Write the history counters back to the vocabulary DataFrame."""
+        df_vocab["ok"] = self.ok.astype(int)
+        df_vocab["not_ok"] = self.not_ok.astype(int)
+        df_vocab["last_ok"] = self.last_ok.astype("datetime64[ns]")
+        df_vocab["last_not_ok"] = self.last_not_ok.astype("datetime64[ns]")
@@ -2,21 +2,43 @@
 
 from typing import TYPE_CHECKING
 
-from gradio import CheckboxGroup
+from gradio import CheckboxGroup, State
+
+from components.ui_funcs import prefetch_next, selection_change
 
 if TYPE_CHECKING:
-    from classes import Section, Subsection
+    from classes import Section
+    from components.deck import Deck
+    from components.review_cameriere import ReviewCameriere
 
 
-def create_checkbox_group(
-    sections: list["Section"],
-    subsections: dict["Section", list["Subsection"]],
-    sss_counts: list[list[int]],
-) -> None:
-    for s_id, s in enumerate(sections):
+def create_checkbox_group(deck: "Deck", rc: "ReviewCameriere | None" = None) -> list[CheckboxGroup]:
+    """One group per section of the deck, with the subsections selected in the session,
+    all of them by default. Groups are keyed on their section, subsections and counts,
+    so that a new render only replaces those which changed.
+    """
+    selection = None if rc is None else rc.get_selection()
+    return [
         CheckboxGroup(
-            subsections[s],
-            value=subsections[s],
-            label=f"{s} ({sum(sss_counts[s_id])})",
+            deck.subsections[s],
+            value=deck.subsections[s] if selection is None else selection[s],
+            label=f"{s} ({sum(deck.sss_counts[s_id])})",
             interactive=True,
+            key=repr((s, deck.subsections[s], deck.sss_counts[s_id])),
         )
+        for s_id, s in enumerate(deck.sections)
+    ]
+
+
+def set_change_events(
+    checkbox_groups: list[CheckboxGroup],
+    sections: list["Section"],
+    session: State,
+) -> None:
+    for checkbox_group in checkbox_groups:
+        checkbox_group.change(
+            selection_change(sections),
+            inputs=[session] + checkbox_groups,
+            outputs=session,
+            concurrency_limit=None,
+        ).then(prefetch_next(), inputs=session, concurrency_limit=None)
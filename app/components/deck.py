@@ -0,0 +1,338 @@
+"""Script for the vocabulary deck shared by all review sessions."""
+
+import datetime as dt
+import threading
+import weakref
+from collections.abc import Callable
+from contextlib import ExitStack
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from components.answers import AnswerIndex
+from components.card_store import ALL_LANGUAGES, CardStore
+from components.rc_utils import load_scheduler
+from components.stats import DeckStats, last_review
+from data.loading import merge_history
+from data.search import SearchIndex
+from data.utils import join_ids
+from metrics import timed
+from options import COLUMN
+
+if TYPE_CHECKING:
+    from api import ApiSession
+    from classes import Section, Subsection
+    from components.rc_utils import Scheduler
+    from components.review_cameriere import ReviewCameriere
+    from data.writer import BackgroundWriter
+
+TODAY = np.datetime64(dt.date.today(), "D")
+
+
+def format_dates(dates: np.ndarray) -> np.ndarray:
+    """Dates as ISO strings, with missing dates left empty."""
+    return np.where(np.isnat(dates), "", np.datetime_as_string(dates, unit="D"))
+
+
+class Deck:
+    """Vocabulary shared by all review sessions.
+    Sessions only write the history counters, one grade at a time under a lock.
+    The hot path works on the card store; `df_vocab` is synced with `sync_df`.
+    If `lean`, the card store is memory-lean and `df_vocab` is not kept at all.
+    A reload renumbers the rows, so the sessions are registered to follow it: it
+    takes `reload_lock`, then each session's lock, then `lock`, in this order.
+    """
+    def __init__(
+        self,
+        df_vocab: pd.DataFrame,
+        sections: list["Section"],
+        subsections: dict["Section", list["Subsection"]],
+        sss_counts: list[list[int]],
+        recorder: "BackgroundWriter | None" = None,
+        lean: bool = False,
+    ):
+        self.lean = lean
+        self.df_vocab = None if lean else df_vocab
+        self.store = CardStore(df_vocab, lean=lean)
+        self.answers = AnswerIndex(self.store)
+        self.recorder = recorder
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.sessions: weakref.WeakSet[ReviewCameriere | ApiSession] = weakref.WeakSet()
+        self.version = 0
+        self.search_index: SearchIndex | None = None
+        self.word_order: np.ndarray | None = None
+        # Ids of the words of some (section, subsection) pairs, if a database can look them up
+        self.section_source: Callable[[list[tuple[int, int]]], np.ndarray] | None = None
+        # Counters of the words removed by a reload, in case they are added back
+        self.removed_history = self.store.vocab_frame().iloc[:0]
+        self.set_sections(sections, subsections, sss_counts)
+
+    def set_sections(
+        self,
+        sections: list["Section"],
+        subsections: dict["Section", list["Subsection"]],
+        sss_counts: list[list[int]],
+    ) -> None:
+        """Set the sections of the card store's rows, and the statistics based on them."""
+        assert not self.lean or max(len(sections), *map(len, sss_counts)) <= np.iinfo(np.int16).max
+        self.sections = sections
+        self.subsections = subsections
+        self.sss_counts = sss_counts
+        self.stats = DeckStats(self.store, sss_counts)
+
+        # Rows are sorted by section and subsection, so each pair is a row range
+        self.sss_ranges: list[list[tuple[int, int]]] = []
+        start = 0
+        for counts in sss_counts:
+            ranges = []
+            for count in counts:
+                ranges.append((start, start + count))
+                start += count
+            self.sss_ranges.append(ranges)
+
+    def get_ss(self, s_id: int, ss_id: int) -> tuple["Section", "Subsection"]:
+        """Get section and subsection."""
+        s = self.sections[s_id]
+        return s, self.subsections[s][ss_id]
+
+    def get_sss_ids(self, row_iat: int) -> tuple[int, int]:
+        """Get section id and subsection id of a word."""
+        return int(self.store.sezione_id[row_iat]), int(self.store.sottosezione_id[row_iat])
+
+    def get_rows(self, sss: list[tuple[int, int]]) -> np.ndarray:
+        """Get the rows of the given (section, subsection) pairs, in order.
+        Must be called with a session's lock, or the deck's during a reload.
+        """
+        if self.section_source is not None:
+            rows = self._find_rows(self.section_source(sss))
+            return np.sort(rows[rows >= 0]).astype(np.int32)
+        ranges = sorted(self.sss_ranges[s_id][ss_id] for s_id, ss_id in sss)
+        if not ranges:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([np.arange(start, end, dtype=np.int32) for start, end in ranges])
+
+    def get_word(self, row_iat: int, is_foreign: bool, languages: tuple[str, ...] = ALL_LANGUAGES) -> str:
+        return self.store.get_word(row_iat, is_foreign, languages)
+
+    def find_rows(self, word_ids: np.ndarray) -> np.ndarray:
+        """Rows of the words with the given ids, -1 for the ids not in the deck."""
+        with self.lock:
+            return self._find_rows(word_ids)
+
+    def _find_rows(self, word_ids: np.ndarray) -> np.ndarray:
+        if self.word_order is None:
+            self.word_order = np.argsort(self.store.parola_id)
+        ids = self.store.parola_id
+        pos = np.searchsorted(ids, word_ids, sorter=self.word_order)
+        rows = self.word_order[np.minimum(pos, ids.size - 1)]
+        return np.where(ids[rows] == word_ids, rows, -1)
+
+    def open_session(self, session: "ReviewCameriere | ApiSession", ordering: str) -> "Scheduler":
+        """Register a new review session, to be remapped on reload, and return its scheduler."""
+        with self.reload_lock:
+            self.sessions.add(session)
+            return load_scheduler(ordering, self.store)
+
+    def grade(self, row_iat: int, is_error: bool) -> None:
+        """Merge a grade into the history counters."""
+        with self.lock:
+            self.stats.grade(row_iat, is_error, TODAY)
+            self.store.grade(row_iat, is_error, TODAY)
+            if self.recorder is not None:
+                self.recorder.record(
+                    self.store.italiano[row_iat],
+                    int(self.store.parola_id[row_iat]),
+                    is_error,
+                    dt.datetime.now(),
+                    glossary_id=int(self.store.glossario_id[row_iat]),
+                )
+
+    def grade_many(self, row_iats: np.ndarray, is_error: np.ndarray) -> None:
+        """Merge many grades into the history counters at once, in order."""
+        with self.lock:
+            self.stats.grade_many(row_iats, is_error, TODAY)
+            self.store.grade_many(row_iats, is_error, TODAY)
+            if self.recorder is not None:
+                now = dt.datetime.now()
+                for row_iat, row_is_error in zip(row_iats.tolist(), is_error.tolist()):
+                    self.recorder.record(
+                        self.store.italiano[row_iat],
+                        int(self.store.parola_id[row_iat]),
+                        row_is_error,
+                        now,
+                        glossary_id=int(self.store.glossario_id[row_iat]),
+                    )
+
+    def index_in_background(self) -> None:
+        """Build the search index of the words in a background thread.
+        The index is dropped if the deck is reloaded in the meantime.
+        """
+        version, italiano, traduzione = self.version, self.store.italiano, self.store.traduzione
+
+        def index() -> None:
+            search_index = SearchIndex(italiano, traduzione)
+            with self.lock:
+                if self.version == version:
+                    self.search_index = search_index
+
+        threading.Thread(target=index, name="search-index", daemon=True).start()
+
+    def search(self, query: str) -> pd.DataFrame | None:
+        """Words matching a query, with their section, subsection and history counters.
+        Returns None while the search index is being built.
+        """
+        with self.lock:
+            if self.search_index is None:
+                return None
+            rows = self.search_index.search(query)
+            return pd.DataFrame({
+                COLUMN.ITALIAN: self.store.italiano[rows].astype(object),
+                COLUMN.TRANSLATION: self.store.traduzione[rows].astype(object),
+                COLUMN.SECTION: [self.sections[s_id] for s_id in self.store.sezione_id[rows]],
+                COLUMN.SUBSECTION: [self.get_ss(*self.get_sss_ids(row))[1] for row in rows],
+                "ok": self.store.ok[rows],
+                "not_ok": self.store.not_ok[rows],
+                "last_ok": format_dates(self.store.last_ok[rows]),
+                "last_not_ok": format_dates(self.store.last_not_ok[rows]),
+            })
+
+    # * Reload
+
+    def sss_pairs(self) -> dict[tuple["Section", "Subsection"], tuple[int, int]]:
+        """Ids of each (section, subsection) pair."""
+        return {
+            (s, ss): (s_id, ss_id)
+            for s_id, s in enumerate(self.sections)
+            for ss_id, ss in enumerate(self.subsections[s])
+        }
+
+    def sss_names(self) -> np.ndarray:
+        """(Section, subsection) of each row, as a single string."""
+        names = np.array([f"{s}\n{ss}" for s in self.sections for ss in self.subsections[s]], dtype=object)
+        return names[self.stats.ss_offsets[self.store.sezione_id] + self.store.sottosezione_id]
+
+    @timed("deck.reload")
+    def reload(
+        self,
+        df_vocab: pd.DataFrame,
+        sections: list["Section"],
+        subsections: dict["Section", list["Subsection"]],
+        sss_counts: list[list[int]],
+    ) -> tuple[int, int, int]:
+        """Replace the words with a new version of the glossary, prepared but without
+        history, and return the number of added, removed and changed words.
+        Words are matched on their ids, so on their Italian word, and keep their
+        counters, even if unsaved; so do the words removed and later added back.
+        Sessions keep their queues and selections, without the removed words.
+        """
+        with self.reload_lock, ExitStack() as stack:
+            sessions = list(self.sessions)
+            for session in sessions:
+                stack.enter_context(session.lock)
+            stack.enter_context(self.lock)
+
+            store = self.store
+            history = pd.concat([store.vocab_frame(), self.removed_history], ignore_index=True)
+            df_vocab = merge_history(df_vocab, history)
+            new_ids = df_vocab[COLUMN.WORD_ID].to_numpy()
+            old_rows, new_rows = join_ids(store.parola_id, new_ids)
+
+            row_map = np.full(len(store), -1, dtype=np.int64)
+            row_map[old_rows] = new_rows
+            is_added = np.ones(new_ids.size, dtype=bool)
+            is_added[new_rows] = False
+            added_rows = np.flatnonzero(is_added)
+
+            # Kept words whose text or subsection changed
+            old_sss = self.sss_names()[old_rows]
+            old_words = [store.italiano[old_rows].astype(object)]
+            old_words += [store.translations[lang][old_rows].astype(object) for lang in ALL_LANGUAGES]
+            old_pairs = self.sss_pairs()
+
+            is_removed = ~np.isin(history[COLUMN.WORD_ID].to_numpy(), new_ids)
+            self.removed_history = history[is_removed & (history["ok"] + history["not_ok"] > 0).to_numpy()]
+            old_flat = self.stats.ss_offsets[store.sezione_id] + store.sottosezione_id
+            removed_last = last_review(store, row_map < 0)
+            store.load(df_vocab)
+            self.df_vocab = None if self.lean else df_vocab
+            if (sections, subsections, sss_counts) == (self.sections, self.subsections, self.sss_counts):
+                # Same row ranges, so only the subsections whose words changed are updated
+                new_flat = self.stats.ss_offsets[store.sezione_id] + store.sottosezione_id
+                is_moved = old_flat[old_rows] != new_flat[new_rows]
+                ss_flat = np.unique(np.concatenate([
+                    old_flat[row_map < 0],
+                    new_flat[added_rows],
+                    old_flat[old_rows[is_moved]],
+                    new_flat[new_rows[is_moved]],
+                ]))
+                ranges = [r for s_ranges in self.sss_ranges for r in s_ranges]
+                ss_rows = np.concatenate(
+                    [np.arange(*ranges[flat_id]) for flat_id in ss_flat.tolist()] + [np.empty(0, dtype=int)]
+                )
+                self.stats.remap(row_map, added_rows, ss_flat, ss_rows, removed_last)
+            else:
+                self.set_sections(sections, subsections, sss_counts)
+            self.word_order = None
+            self.version += 1
+
+            is_changed = self.sss_names()[new_rows] != old_sss
+            new_words = [store.italiano[new_rows]] + [store.translations[lang][new_rows] for lang in ALL_LANGUAGES]
+            for old, new in zip(old_words, new_words):
+                old, new = pd.Series(old), pd.Series(new.astype(object))
+                is_changed |= ~(old.eq(new) | (old.isna() & new.isna())).to_numpy()
+            answer_map = row_map.copy()
+            answer_map[old_rows[is_changed]] = -1
+            self.answers.remap(answer_map)
+
+            new_pairs = self.sss_pairs()
+            sss_map = {old: new_pairs[pair] for pair, old in old_pairs.items() if pair in new_pairs}
+            for session in sessions:
+                scheduler = session.scheduler
+                sss = None if scheduler.sss is None else {sss_map[p] for p in scheduler.sss if p in sss_map} or None
+                scheduler.remap(row_map, added_rows, sss, None if sss is None else self.get_rows(list(sss)))
+                session.remap(row_map)
+
+            reindex = self.search_index is not None
+            self.search_index = None
+        if reindex:
+            self.index_in_background()
+
+        return added_rows.size, int((row_map < 0).sum()), int(is_changed.sum())
+
+    def stats_tables(self) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Statistics of the sections, subsections, words with the most errors and recent activity."""
+        with self.lock:
+            return (
+                self.stats.sections_table(self.sections),
+                self.stats.subsections_table(self.sections, self.subsections),
+                self.stats.error_heavy_table(),
+                self.stats.activity_table(TODAY),
+            )
+
+    def sync_df(self) -> pd.DataFrame:
+        """Sync the history counters of the vocabulary DataFrame, before saving it.
+        If lean, a DataFrame with the words and their counters is built instead.
+        """
+        with self.lock:
+            if self.lean:
+                return self.store.vocab_frame()
+            self.store.sync_to_df(self.df_vocab)
+        return self.df_vocab
+
+    def memory_report(self) -> None:
+        """Print the bytes used by each column of the deck.
+        Unless lean, the store's words are the same objects as `df_vocab`'s, so they are counted twice.
+        """
+        usage = {f"store.{col}": n_bytes for col, n_bytes in self.store.memory_usage().items()}
+        if self.df_vocab is not None:
+            usage |= {
+                f"df_vocab.{col}": int(n_bytes)
+                for col, n_bytes in self.df_vocab.memory_usage(deep=True, index=False).items()
+            }
+
+        width = max(map(len, usage))
+        for col, n_bytes in usage.items():
+            print(f"{col:<{width}} {n_bytes / 2 ** 20:>10.2f} MB")
+        print(f"{'Total':<{width}} {sum(usage.values()) / 2 ** 20:>10.2f} MB")
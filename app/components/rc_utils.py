@@ -2,18 +2,26 @@
 
 from typing import TYPE_CHECKING, Callable
 
+from components.schedulers import (
+    PriorityScheduler,
+    SpacedRepetitionScheduler,
+    StaticScheduler,
+)
 from options import ORDERING
 
 if TYPE_CHECKING:
     from numpy import ndarray
     from pandas import DataFrame
 
-    from components.states import SSStates
+    from components.card_store import CardStore
 
 OrderingFunction = Callable[["DataFrame"], "ndarray"]
+Scheduler = StaticScheduler | PriorityScheduler | SpacedRepetitionScheduler
 
+RANDOMNESS_SIGMA = 0.33
 
-def load_ordering(ordering: str) -> OrderingFunction:
+
+def load_ordering(ordering: str, randomness_sigma: float = RANDOMNESS_SIGMA) -> OrderingFunction:
     if ordering == ORDERING.RANDOM:
         from flashcards import random_ordering
         return random_ordering
@@ -25,27 +33,14 @@ def load_ordering(ordering: str) -> OrderingFunction:
         return net_errors_ordering
     elif ordering == ORDERING.NET_ERRORS_WEIGHTED:
         from flashcards import make_net_weighted_errors_ordering
-        return make_net_weighted_errors_ordering(randomness_sigma=0.33)
+        return make_net_weighted_errors_ordering(randomness_sigma)
     else:
         raise ValueError(f"Ordering not recognized: '{ordering}'")
 
 
-def init_ss_states(ss_states, sss_list: list) -> None:
-    ss_states.row_iat.value = sss_list[0]
-    ss_states.S.value = sss_list[1]
-    ss_states.SS.value = sss_list[2]
-
-
-def get_next_iats(
-    df_vocab: "DataFrame",
-    ss_states: "SSStates",
-    is_error: bool,
-) -> tuple[int, int, int]:
-    """Returns: row_iat, str_status_iat, date_str_col_iat."""
-    str_status = "not_ok" if is_error else "ok"
-    date_str_col = f"last_{str_status}"
-    return (
-        ss_states.row_iat.value,
-        df_vocab.columns.get_loc(str_status),
-        df_vocab.columns.get_loc(date_str_col),
-    )
+def load_scheduler(ordering: str, store: "CardStore") -> Scheduler:
+    if ordering == ORDERING.PRIORITY_QUEUE:
+        return PriorityScheduler(store, load_ordering(ORDERING.NET_ERRORS))
+    elif ordering == ORDERING.SPACED_REPETITION:
+        return SpacedRepetitionScheduler(store)
+    return StaticScheduler(store, load_ordering(ordering))
@@ -1,91 +1,163 @@
 """Script for data handling."""
 
-import datetime as dt
+import threading
 from typing import TYPE_CHECKING, Literal
 
-import pandas as pd
-
-from components.rc_utils import get_next_iats, init_ss_states, load_ordering
+from components.card_store import select_languages
+from metrics import timed
 
 if TYPE_CHECKING:
     from numpy import ndarray
 
     from classes import Section, Subsection
-    from components.states import SSStates
-
-TODAY = dt.date.today()
-PD_TODAY = pd.to_datetime(TODAY)
+    from components.deck import Deck
 
 
 class ReviewCameriere:
-    """Sets the order of the review flashcards."""
+    """Sets the order of the review flashcards of a session.
+    The next card is prefetched, with its front and back already resolved,
+    so that giving feedback only has to swap it in.
+    Translations are shown in the selected `languages`, all of them by default.
+    """
     def __init__(
         self,
-        df_vocab: pd.DataFrame,
-        sections: list["Section"],
-        subsections: dict["Section", list["Subsection"]],
-        ss_states: "SSStates",
+        deck: "Deck",
         ordering: Literal["alphabetic", "net_errors"],
         foreign_in_front: bool,
+        languages: list[str] | None = None,
     ):
-        self.df_vocab = df_vocab
-        self.sections = sections
-        self.subsections = subsections
-        self.ss_states = ss_states
+        self.deck = deck
+        self.ordering = ordering
         self.foreign_in_front = foreign_in_front
+        self.languages = select_languages(languages)
 
-        self.get_order = load_ordering(ordering)
+        self.lock = threading.Lock()
+        self.scheduler = deck.open_session(self, ordering)
+        self.row_iat: int | None = None
+        self.front = ""
+        self.back = ""
+        self.prefetched: tuple[int, str, str] | None = None
+        self.n_ok = 0
+        self.n_not_ok = 0
 
-        self.ordered_row_ids: "ndarray" = self.get_order(self.df_vocab)
-        self.pointer = -1
-
-        sss_list = self.next(is_error=False, update=False)
-        init_ss_states(self.ss_states, sss_list)
+        self.next(is_error=False, update=False)
 
     def get_ss(self, s_id: int, ss_id: int) -> tuple["Section", "Subsection"]:
         """Get section and subsection."""
-        s = self.sections[s_id]
-        return s, self.subsections[s][ss_id]
+        return self.deck.get_ss(s_id, ss_id)
 
     def current_front(self) -> str:
         """Get current word to review (front)."""
-        return self.ss_states.get_word(
-            self.df_vocab,
-            is_foreign=self.foreign_in_front,
-        )
+        return self.front
 
     def current_back(self) -> str:
         """Get current word's answer (back)."""
-        return self.ss_states.get_word(
-            self.df_vocab,
-            is_foreign=not self.foreign_in_front,
-        )
-
-    def _get_sss_list(self) -> list:
-        """Get SSS list of related objects. Pointer must have already been changed."""
-        row_iat = self.ordered_row_ids[self.pointer]
-        row = self.df_vocab.iloc[row_iat]
+        return self.back
 
-        s_id = row["sezione_id"]
-        ss_id = row["sottosezione_id"]
+    def get_sss_list(self) -> list:
+        """Get SSS list of related objects of the current word."""
+        s_id, ss_id = self.deck.get_sss_ids(self.row_iat)
         s, ss = self.get_ss(s_id, ss_id)
 
         return [
-            row_iat,
+            self.row_iat,
             {"id": s_id, "value": s},
             {"id": ss_id, "value": ss},
         ]
 
+    def get_selection(self) -> dict["Section", list["Subsection"]] | None:
+        """Selected subsections of each section, None if the whole deck is reviewed."""
+        with self.lock:
+            if self.scheduler.sss is None:
+                return None
+            selection = {s: [] for s in self.deck.sections}
+            for s_id, ss_id in sorted(self.scheduler.sss):
+                s, ss = self.get_ss(s_id, ss_id)
+                selection[s].append(ss)
+            return selection
+
+    def set_selection(self, selection: dict["Section", list["Subsection"]]) -> None:
+        """Only review the selected subsections of each section.
+        An empty selection means the whole deck.
+        """
+        with self.lock:
+            # Subsections removed by a reload of the deck are ignored
+            pairs = self.deck.sss_pairs()
+            sss = {pairs[(s, ss)] for s, ss_list in selection.items() for ss in ss_list if (s, ss) in pairs}
+            n_sss = len(pairs)
+            # The prefetched card might not be selected anymore
+            self.prefetched = None
+            if not sss or len(sss) == n_sss:
+                self.scheduler.restrict(None, None)
+            else:
+                self.scheduler.restrict(self.deck.get_rows(list(sss)), sss)
+
+    def set_display(self, foreign_in_front: bool, languages: list[str] | None) -> None:
+        """Switch the side of the Italian word and the languages of the translations.
+        The current card is shown again from its front, and the prefetched one is resolved again.
+        """
+        with self.lock:
+            self.foreign_in_front = foreign_in_front
+            self.languages = select_languages(languages)
+            self.prefetched = None
+            if self.row_iat is not None:
+                self.front, self.back = self._resolve(self.row_iat)
+
+    def remap(self, row_map: "ndarray") -> None:
+        """Follow a reload of the deck, which already remapped the scheduler.
+        The current word is not graded if it was removed, and the prefetched one is chosen again.
+        """
+        if self.row_iat is not None:
+            self.row_iat = int(row_map[self.row_iat]) if row_map[self.row_iat] >= 0 else None
+        self.prefetched = None
+
+    def _resolve(self, row_iat: int) -> tuple[str, str]:
+        """Front and back of a card."""
+        return (
+            self.deck.get_word(row_iat, self.foreign_in_front, self.languages),
+            self.deck.get_word(row_iat, not self.foreign_in_front, self.languages),
+        )
+
+    def _prefetch(self) -> None:
+        if self.prefetched is None:
+            row_iat = self.scheduler.pop()
+            self.prefetched = (row_iat, *self._resolve(row_iat))
+            self.deck.answers.get(row_iat, not self.foreign_in_front, self.languages)
+
+    @timed("review.prefetch")
+    def prefetch(self) -> None:
+        """Choose the next word to review ahead of the feedback. Does nothing if
+        it was already chosen.
+        """
+        with self.lock:
+            self._prefetch()
+
+    @timed("review.check_answer")
+    def check_answer(self, typed: str) -> bool:
+        """Whether a typed answer matches the back of the current word."""
+        with self.lock:
+            if self.row_iat is None:
+                return False
+            return self.deck.answers.check(self.row_iat, not self.foreign_in_front, self.languages, typed)
+
+    @timed("review.next")
     def next(self, is_error: bool, update: bool) -> list:
-        """Choose next word to review and return the relevant Gradio States."""
-        # Feedback
-        if update:
-            row_iat, str_status_iat, date_str_col_iat = get_next_iats(
-                self.df_vocab, self.ss_states, is_error,
-            )
-            self.df_vocab.iat[row_iat, str_status_iat] += 1
-            self.df_vocab.iat[row_iat, date_str_col_iat] = PD_TODAY
-
-        # Next word
-        self.pointer += 1
-        return self._get_sss_list()
+        """Move to the next word to review and return its SSS list.
+        If it was not prefetched, it is chosen now.
+        """
+        with self.lock:
+            if self.row_iat is not None:
+                # Feedback
+                if update:
+                    self.deck.grade(self.row_iat, is_error)
+                    if is_error:
+                        self.n_not_ok += 1
+                    else:
+                        self.n_ok += 1
+                self.scheduler.grade(self.row_iat, is_error, update)
+
+            # Next word
+            self._prefetch()
+            self.row_iat, self.front, self.back = self.prefetched
+            self.prefetched = None
+            return self.get_sss_list()
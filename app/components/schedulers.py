@@ -0,0 +1,247 @@
+"""ReviewCameriere schedulers.
+
+A scheduler chooses the row of the next card to review (`pop`) and gets notified
+of the feedback given to the current card (`grade`). Each review session has its
+own scheduler, so they only keep compact per-card arrays.
+"""
+
+import datetime as dt
+import heapq
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from flashcards import (
+    SR_EASE_BONUS,
+    SR_EASE_PENALTY,
+    SR_MAX_EASE,
+    SR_MAX_STABILITY,
+    SR_MIN_EASE,
+    spaced_repetition_memory,
+)
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+    from components.card_store import CardStore
+    from components.rc_utils import OrderingFunction
+
+
+class QueueScheduler(ABC):
+    """Goes through a queue of rows, refilled once exhausted.
+    Requeued cards are kept in a heap keyed by the step when they are due, with
+    one entry per card: `pending` holds the due step of each requeued card, and
+    the heap entries which do not match it are stale. Due cards are served at most
+    every other card, so that the queue keeps moving, and the queued cards waiting
+    in the heap are skipped.
+    The queue can be restricted to the rows of some (section, subsection) pairs.
+    """
+    def __init__(self, store: "CardStore"):
+        self.store = store
+        self.step = 0
+        self.heap: list[tuple[int, int]] = []
+        self.pending: dict[int, int] = {}
+        self.from_heap = False
+
+        self.queue = np.empty(0, dtype=np.int32)
+        self.pointer = 0
+
+        self.rows: ndarray | None = None
+        self.sss: set[tuple[int, int]] | None = None
+
+    @abstractmethod
+    def refill(self) -> "ndarray":
+        """Get the rows of the next queue, among the active rows."""
+
+    def restrict(self, rows: "ndarray | None", sss: set[tuple[int, int]] | None) -> None:
+        """Restrict the queue to some rows, which belong to the `sss` pairs.
+        None means the whole deck.
+        """
+        self.rows = rows
+        self.sss = sss
+        self.queue = self.refill().astype(np.int32)
+        self.pointer = 0
+
+    def is_active(self, row_iat: int) -> bool:
+        return self.sss is None or (
+            (int(self.store.sezione_id[row_iat]), int(self.store.sottosezione_id[row_iat])) in self.sss
+        )
+
+    def requeue(self, row_iat: int, gap: int) -> None:
+        """Requeue a card, replacing its previous entry if it was already requeued."""
+        self.pending[row_iat] = self.step + gap
+        heapq.heappush(self.heap, (self.step + gap, row_iat))
+
+    def pop_heap(self, max_step: float) -> int | None:
+        """Pop the first requeued card due by `max_step` and still active, if any."""
+        while self.heap and self.heap[0][0] <= max_step:
+            step, row_iat = heapq.heappop(self.heap)
+            if self.pending.get(row_iat) != step:
+                continue
+            del self.pending[row_iat]
+            if self.is_active(row_iat):
+                return row_iat
+        return None
+
+    def pop_queue(self) -> int | None:
+        """Pop the next queued card which is not waiting in the heap, refilling the
+        queue once exhausted. None if all the cards of the new queue are waiting.
+        """
+        for _ in range(2):
+            while self.pointer < self.queue.size:
+                row_iat = int(self.queue[self.pointer])
+                self.pointer += 1
+                if row_iat not in self.pending:
+                    return row_iat
+            self.queue = self.refill().astype(np.int32)
+            self.pointer = 0
+        return None
+
+    def pop(self) -> int:
+        self.step += 1
+        row_iat = None if self.from_heap else self.pop_heap(self.step)
+        self.from_heap = row_iat is not None
+        if row_iat is None:
+            row_iat = self.pop_queue()
+        if row_iat is None:
+            row_iat = self.pop_heap(float("inf"))
+        return row_iat
+
+    def grade(self, row_iat: int, is_error: bool, update: bool) -> None:
+        pass
+
+    def remap(
+        self,
+        row_map: "ndarray",
+        added_rows: "ndarray",
+        sss: set[tuple[int, int]] | None,
+        rows: "ndarray | None",
+    ) -> None:
+        """Follow a reload of the store: old rows become `row_map[row]`, or -1 if removed,
+        and the restriction becomes `rows`, of the `sss` pairs. The queue and requeued
+        cards keep their order, and the added rows are queued first.
+        """
+        self.sss = sss
+        self.rows = rows
+        if rows is not None:
+            added_rows = added_rows[np.isin(added_rows, rows)]
+
+        queue = row_map[self.queue[self.pointer:]]
+        self.queue = np.concatenate([added_rows, queue[queue >= 0]]).astype(np.int32)
+        self.pointer = 0
+        self.pending = {
+            int(row_map[row_iat]): step for row_iat, step in self.pending.items() if row_map[row_iat] >= 0
+        }
+        self.heap = [(step, row_iat) for row_iat, step in self.pending.items()]
+        heapq.heapify(self.heap)
+
+
+class StaticScheduler(QueueScheduler):
+    """Goes through a precomputed ordering, which is recomputed once exhausted."""
+    def __init__(self, store: "CardStore", get_order: "OrderingFunction"):
+        super().__init__(store)
+        self.get_order = get_order
+
+    def refill(self) -> "ndarray":
+        return self.get_order(self.store.history_frame(self.rows))
+
+
+class PriorityScheduler(StaticScheduler):
+    """Ordering where the cards still being learned are requeued.
+    Wrong cards come back after `requeue_gap` cards, and skipped cards and right
+    ones which still have net errors after twice as many. Right cards without net
+    errors go back to the ordering, which is recomputed once exhausted.
+    """
+    def __init__(
+        self,
+        store: "CardStore",
+        get_order: "OrderingFunction",
+        requeue_gap: int = 3,
+    ):
+        super().__init__(store, get_order)
+        self.requeue_gap = requeue_gap
+
+    def get_gap(self, net_errors: int, is_error: bool, update: bool) -> int | None:
+        if is_error and update:
+            return self.requeue_gap
+        if not update or net_errors > 0:
+            return 2 * self.requeue_gap
+        return None
+
+    def grade(self, row_iat: int, is_error: bool, update: bool) -> None:
+        net_errors = int(self.store.not_ok[row_iat] - self.store.ok[row_iat])
+        gap = self.get_gap(net_errors, is_error, update)
+        if gap is not None:
+            self.requeue(row_iat, gap)
+
+
+class SpacedRepetitionScheduler(QueueScheduler):
+    """SM-2 style scheduler. Only the cards due today are queued, the most overdue
+    first. Wrong cards are due again tomorrow, but they are also requeued after
+    `requeue_gap` cards, while right ones get a new due date.
+    Once nothing is due, the next `batch_size` cards are queued.
+    """
+    def __init__(
+        self,
+        store: "CardStore",
+        requeue_gap: int = 3,
+        batch_size: int = 50,
+    ):
+        super().__init__(store)
+        self.requeue_gap = requeue_gap
+        self.batch_size = batch_size
+
+        self.today = np.datetime64(dt.date.today(), "D")
+        ease, stability, self.due = spaced_repetition_memory(store.history_frame(), self.today)
+        self.ease = ease.astype(np.float32)
+        self.stability = stability.astype(np.float32)
+
+    def remap(
+        self,
+        row_map: "ndarray",
+        added_rows: "ndarray",
+        sss: set[tuple[int, int]] | None,
+        rows: "ndarray | None",
+    ) -> None:
+        """The memory of the kept cards is moved to their new rows, and the added
+        cards get the one estimated from their history.
+        """
+        kept = row_map >= 0
+        ease, stability, due = spaced_repetition_memory(self.store.history_frame(added_rows), self.today)
+        for name, added in [("ease", ease), ("stability", stability), ("due", due)]:
+            old = getattr(self, name)
+            new = np.empty(len(self.store), dtype=old.dtype)
+            new[row_map[kept]] = old[kept]
+            new[added_rows] = added
+            setattr(self, name, new)
+        super().remap(row_map, added_rows, sss, rows)
+
+    def _sort_by_due(self, row_iats: "ndarray") -> "ndarray":
+        """Sort rows by due date, with random tie-breaking."""
+        order = np.lexsort((np.random.rand(row_iats.size), self.due[row_iats]))
+        return row_iats[order]
+
+    def refill(self) -> "ndarray":
+        rows = np.arange(self.due.size) if self.rows is None else self.rows
+        due = self.due[rows]
+
+        due_rows = rows[due <= self.today]
+        if due_rows.size > 0:
+            return self._sort_by_due(due_rows)
+
+        k = min(self.batch_size, rows.size) - 1
+        return self._sort_by_due(rows[np.argpartition(due, k)[:k + 1]])
+
+    def grade(self, row_iat: int, is_error: bool, update: bool) -> None:
+        if not update:
+            self.requeue(row_iat, 2 * self.requeue_gap)
+        elif is_error:
+            self.ease[row_iat] = max(self.ease[row_iat] - SR_EASE_PENALTY, SR_MIN_EASE)
+            self.stability[row_iat] = 1.0
+            self.due[row_iat] = self.today + np.timedelta64(1, "D")
+            self.requeue(row_iat, self.requeue_gap)
+        else:
+            self.ease[row_iat] = min(self.ease[row_iat] + SR_EASE_BONUS, SR_MAX_EASE)
+            self.stability[row_iat] = min(max(self.stability[row_iat] * self.ease[row_iat], 1.0), SR_MAX_STABILITY)
+            self.due[row_iat] = self.today + np.timedelta64(round(float(self.stability[row_iat])), "D")
@@ -0,0 +1,262 @@
+"""Script for the deck statistics.
+
+Aggregates are computed once from the history counters, with one bincount per
+counter, and then kept up to date one grade at a time, so showing them never
+goes through the whole deck again.
+"""
+
+from itertools import islice
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from options import COLUMN
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+    from classes import Section, Subsection
+    from components.card_store import CardStore
+
+N_ERROR_HEAVY = 20
+N_ACTIVITY_DAYS = 14
+
+
+def last_review(store: "CardStore", rows: "ndarray | int | slice") -> "ndarray":
+    """Date of the last review of the rows, NaT if never reviewed. The dates of the
+    outcomes that never happened are placeholders, so they are ignored.
+    """
+    nat = np.datetime64("NaT", "D")
+    last_ok = np.where(store.ok[rows] > 0, store.last_ok[rows], nat)
+    last_not_ok = np.where(store.not_ok[rows] > 0, store.last_not_ok[rows], nat)
+    return np.fmax(last_ok, last_not_ok)
+
+
+class ErrorRanking:
+    """Words with the most net errors (errors minus successes), ranked exactly.
+    Grades change net errors by one, so words are kept in buckets by net errors
+    and a grade moves a word to the next bucket. Only words above a threshold are
+    tracked; the buckets are rebuilt if too few of them are left.
+    """
+    def __init__(self, store: "CardStore", size: int):
+        self.store = store
+        self.size = size
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        net = self.store.not_ok.astype(np.int64) - self.store.ok
+        net_top = net[np.argpartition(-net, self.size - 1)[:self.size]] if net.size > self.size else net
+        self.threshold = max(int(net_top.min()) if net_top.size else 1, 1)
+        rows = np.flatnonzero(net >= self.threshold)
+        self.buckets: dict[int, set[int]] = {}
+        for row, row_net in zip(rows.tolist(), net[rows].tolist()):
+            self.buckets.setdefault(row_net, set()).add(row)
+
+    def move(self, row_iat: int, old_net: int, new_net: int) -> None:
+        if old_net >= self.threshold:
+            bucket = self.buckets[old_net]
+            bucket.discard(row_iat)
+            if not bucket:
+                del self.buckets[old_net]
+        if new_net >= self.threshold:
+            self.buckets.setdefault(new_net, set()).add(row_iat)
+
+    def remap(self, row_map: "ndarray", added_rows: "ndarray") -> None:
+        """Follow a reload of the deck: `row_map` gives the new row of each old row,
+        -1 if removed, and the `added_rows` are tracked if above the threshold.
+        """
+        buckets = {}
+        for row_net, bucket in self.buckets.items():
+            new_rows = row_map[list(bucket)]
+            if (new_rows >= 0).any():
+                buckets[row_net] = set(new_rows[new_rows >= 0].tolist())
+        self.buckets = buckets
+
+        net = self.store.not_ok[added_rows].astype(np.int64) - self.store.ok[added_rows]
+        for row, row_net in zip(added_rows.tolist(), net.tolist()):
+            if row_net >= self.threshold:
+                self.buckets.setdefault(row_net, set()).add(row)
+
+    def top(self) -> list[tuple[int, int]]:
+        """(row, net errors) of the words with the most net errors, ties in no particular order."""
+        if sum(map(len, self.buckets.values())) < self.size and self.threshold > 1:
+            self.rebuild()
+        result = []
+        for row_net in sorted(self.buckets, reverse=True):
+            result += [(row, row_net) for row in islice(self.buckets[row_net], self.size - len(result))]
+            if len(result) == self.size:
+                break
+        return result
+
+
+class DeckStats:
+    """Per-section and per-subsection accuracy and coverage, words with the most
+    errors and recent activity of a deck.
+    Subsection aggregates are indexed by their flat id, `ss_offsets[s_id] + ss_id`.
+    """
+    def __init__(self, store: "CardStore", sss_counts: list[list[int]]):
+        self.store = store
+        self.ss_offsets = np.cumsum([0] + [len(counts) for counts in sss_counts])
+        self.ss_section = np.repeat(np.arange(len(sss_counts)), np.diff(self.ss_offsets))
+
+        flat_ids = self.ss_offsets[store.sezione_id] + store.sottosezione_id
+        n_ss = int(self.ss_offsets[-1])
+        self.n_words = np.bincount(flat_ids, minlength=n_ss)
+        self.n_seen = np.bincount(flat_ids, weights=(store.ok + store.not_ok) > 0, minlength=n_ss).astype(np.int64)
+        self.n_ok = np.bincount(flat_ids, weights=store.ok, minlength=n_ss).astype(np.int64)
+        self.n_not_ok = np.bincount(flat_ids, weights=store.not_ok, minlength=n_ss).astype(np.int64)
+
+        self.error_ranking = ErrorRanking(store, N_ERROR_HEAVY)
+
+        # Words by the date of their last review (NaT is None once a list)
+        dates, counts = np.unique(last_review(store, slice(None)), return_counts=True)
+        self.last_review_counts = {
+            date: int(n) for date, n in zip(dates.tolist(), counts.tolist()) if date is not None
+        }
+
+    def remap(
+        self,
+        row_map: "ndarray",
+        added_rows: "ndarray",
+        ss_flat: "ndarray",
+        rows: "ndarray",
+        removed_last: "ndarray",
+    ) -> None:
+        """Follow a reload of the deck which kept its sections and their counts, once the
+        card store is loaded. Only the aggregates of the `ss_flat` subsections, whose
+        words changed, are computed again from their `rows`. `removed_last` are the
+        dates of the last review of the removed words.
+        """
+        store = self.store
+        flat_ids = self.ss_offsets[store.sezione_id[rows]] + store.sottosezione_id[rows]
+        n_ss = self.n_words.size
+        ok, not_ok = store.ok[rows], store.not_ok[rows]
+        for counts, weights in [
+            (self.n_seen, (ok + not_ok) > 0),
+            (self.n_ok, ok),
+            (self.n_not_ok, not_ok),
+        ]:
+            counts[ss_flat] = np.bincount(flat_ids, weights=weights, minlength=n_ss)[ss_flat]
+
+        self.error_ranking.remap(row_map, added_rows)
+
+        for dates, sign in [(removed_last, -1), (last_review(store, added_rows), 1)]:
+            days, counts = np.unique(dates[~np.isnat(dates)], return_counts=True)
+            for day, n in zip(days.tolist(), counts.tolist()):
+                self.last_review_counts[day] = self.last_review_counts.get(day, 0) + sign * n
+                if not self.last_review_counts[day]:
+                    del self.last_review_counts[day]
+
+    def grade(self, row_iat: int, is_error: bool, date: "np.datetime64") -> None:
+        """Merge a grade into the aggregates. Must be called before the card store's grade."""
+        store = self.store
+        ss_flat = int(self.ss_offsets[store.sezione_id[row_iat]] + store.sottosezione_id[row_iat])
+        ok, not_ok = int(store.ok[row_iat]), int(store.not_ok[row_iat])
+
+        if ok + not_ok == 0:
+            self.n_seen[ss_flat] += 1
+        if is_error:
+            self.n_not_ok[ss_flat] += 1
+        else:
+            self.n_ok[ss_flat] += 1
+        self.error_ranking.move(row_iat, not_ok - ok, not_ok - ok + (1 if is_error else -1))
+
+        last = last_review(store, row_iat)
+        if not np.isnat(last):
+            old = last.item()
+            self.last_review_counts[old] -= 1
+            if not self.last_review_counts[old]:
+                del self.last_review_counts[old]
+        day = date.item()
+        self.last_review_counts[day] = self.last_review_counts.get(day, 0) + 1
+
+    def grade_many(self, row_iats: "ndarray", is_error: "ndarray", date: "np.datetime64") -> None:
+        """Merge many grades into the aggregates, as `grade` one at a time would.
+        Must be called before the card store's `grade_many`.
+        """
+        store = self.store
+        rows, inverse = np.unique(row_iats, return_inverse=True)
+        n_errors = np.bincount(inverse, weights=is_error, minlength=rows.size).astype(np.int64)
+        n_grades = np.bincount(inverse, minlength=rows.size)
+        ss_flat = self.ss_offsets[store.sezione_id[rows]] + store.sottosezione_id[rows]
+        n_ss = self.n_words.size
+
+        ok, not_ok = store.ok[rows].astype(np.int64), store.not_ok[rows].astype(np.int64)
+        self.n_seen += np.bincount(ss_flat[ok + not_ok == 0], minlength=n_ss)
+        self.n_not_ok += np.bincount(ss_flat, weights=n_errors, minlength=n_ss).astype(np.int64)
+        self.n_ok += np.bincount(ss_flat, weights=n_grades - n_errors, minlength=n_ss).astype(np.int64)
+
+        old_net = not_ok - ok
+        new_net = old_net + 2 * n_errors - n_grades
+        for row, row_old, row_new in zip(rows.tolist(), old_net.tolist(), new_net.tolist()):
+            self.error_ranking.move(row, row_old, row_new)
+
+        last = last_review(store, rows)
+        olds, counts = np.unique(last[~np.isnat(last)], return_counts=True)
+        for old, n in zip(olds.tolist(), counts.tolist()):
+            self.last_review_counts[old] -= n
+            if not self.last_review_counts[old]:
+                del self.last_review_counts[old]
+        day = date.item()
+        self.last_review_counts[day] = self.last_review_counts.get(day, 0) + rows.size
+
+    # * Tables
+
+    @staticmethod
+    def table(
+        names: dict[str, list],
+        n_words: "ndarray",
+        n_seen: "ndarray",
+        n_ok: "ndarray",
+        n_not_ok: "ndarray",
+    ) -> pd.DataFrame:
+        n_grades = n_ok + n_not_ok
+        return pd.DataFrame(names | {
+            "parole": n_words,
+            "viste": n_seen,
+            "non viste": n_words - n_seen,
+            "ok": n_ok,
+            "not_ok": n_not_ok,
+            "precisione %": np.round(100 * n_ok / np.maximum(n_grades, 1), 1),
+        })
+
+    def sections_table(self, sections: list["Section"]) -> pd.DataFrame:
+        return self.table(
+            {COLUMN.SECTION: sections},
+            *(np.add.reduceat(counts, self.ss_offsets[:-1]) for counts in [
+                self.n_words, self.n_seen, self.n_ok, self.n_not_ok,
+            ]),
+        )
+
+    def subsections_table(
+        self,
+        sections: list["Section"],
+        subsections: dict["Section", list["Subsection"]],
+    ) -> pd.DataFrame:
+        return self.table(
+            {
+                COLUMN.SECTION: [sections[s_id] for s_id in self.ss_section],
+                COLUMN.SUBSECTION: [ss for s in sections for ss in subsections[s]],
+            },
+            self.n_words, self.n_seen, self.n_ok, self.n_not_ok,
+        )
+
+    def error_heavy_table(self) -> pd.DataFrame:
+        top = self.error_ranking.top()
+        rows = [row for row, _ in top]
+        return pd.DataFrame({
+            COLUMN.ITALIAN: self.store.italiano[rows].astype(object),
+            COLUMN.TRANSLATION: self.store.traduzione[rows].astype(object),
+            "errori netti": [net for _, net in top],
+            "ok": self.store.ok[rows],
+            "not_ok": self.store.not_ok[rows],
+        })
+
+    def activity_table(self, today: "np.datetime64") -> pd.DataFrame:
+        """Words by the day of their last review, for the last days."""
+        days = today - np.arange(N_ACTIVITY_DAYS)
+        return pd.DataFrame({
+            "giorno": np.datetime_as_string(days, unit="D"),
+            "parole ripassate": [self.last_review_counts.get(day, 0) for day in days.tolist()],
+        })
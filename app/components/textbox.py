@@ -1,13 +1,35 @@
 """Module for Gradio textboxes."""
 
-from gradio import Textbox
+from gradio import Button, State, Textbox
 
-from components.ui_funcs import ITA_LABEL, TRAD_LABEL
+from components.ui_funcs import (
+    ANSWER_LABEL,
+    ITA_LABEL,
+    TRAD_LABEL,
+    answer_submit,
+    prefetch_next,
+)
 
 
-def create_question_textbox(rc, foreign_in_front: bool) -> Textbox:
+def create_question_textbox(foreign_in_front: bool) -> Textbox:
     return Textbox(
-        value=rc.current_front(),
         label=ITA_LABEL if foreign_in_front else TRAD_LABEL,
         interactive=False,
     )
+
+
+def create_answer_textbox() -> Textbox:
+    return Textbox(
+        label=ANSWER_LABEL,
+        placeholder="Scrivi la soluzione e premi Invio",
+        interactive=True,
+    )
+
+
+def set_submit_event(answer: Textbox, session: State, review_comps: list[Button | Textbox]) -> None:
+    answer.submit(
+        answer_submit(),
+        inputs=[session, answer],
+        outputs=[session] + review_comps + [answer],
+        concurrency_limit=None,
+    ).then(prefetch_next(), inputs=session, concurrency_limit=None)
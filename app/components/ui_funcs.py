@@ -1,15 +1,32 @@
 """UI functions' script."""
 
-import gradio as gr
 from typing import Any, TYPE_CHECKING
 
+import gradio as gr
+
+from components.card_store import ALL_LANGUAGES
+from components.review_cameriere import ReviewCameriere
+from metrics import count, timed
+from options import COLUMN
+
 if TYPE_CHECKING:
-    from components.review_cameriere import ReviewCameriere
+    from classes import Section
+    from components.deck import Deck
 
 GradioUpdate = dict[str, Any]
 
+LANGUAGE_FLAGS = {COLUMN.SPANISH: "🇪🇸", COLUMN.ENGLISH: "🇬🇧"}
+# Choices of the direction radio, whose index is `foreign_in_front`
+DIRECTIONS = ["Traduzione → Italiano", "Italiano → Traduzione"]
+
+
+def trad_label(languages: tuple[str, ...]) -> str:
+    return " ".join(["Traduzione"] + [LANGUAGE_FLAGS.get(lang, lang) for lang in languages])
+
+
 ITA_LABEL = "Italiano 🇮🇹"
-TRAD_LABEL = "Traduzione 🇪🇸 🇬🇧"
+TRAD_LABEL = trad_label(ALL_LANGUAGES)
+ANSWER_LABEL = "Risposta ⌨️"
 
 
 def toggle_buttons_interactivity(done: bool) -> list[GradioUpdate]:
@@ -21,15 +38,32 @@ def toggle_buttons_interactivity(done: bool) -> list[GradioUpdate]:
     ]
 
 
-def solution_click(rc: "ReviewCameriere"):
-    def solution_fn():
+def front_update(rc: ReviewCameriere) -> GradioUpdate:
+    return gr.update(
+        value=rc.current_front(),
+        label=ITA_LABEL if rc.foreign_in_front else trad_label(rc.languages),
+    )
+
+
+def start_session(deck: "Deck", ordering: str, foreign_in_front: bool, languages: list[str] | None):
+    def start_fn():
+        """Page load function, which creates the ReviewCameriere of the session."""
+        rc = ReviewCameriere(deck, ordering=ordering, foreign_in_front=foreign_in_front, languages=languages)
+        return rc, front_update(rc)
+
+    return start_fn
+
+
+def solution_click():
+    @timed("ui.solution_click")
+    def solution_fn(rc: ReviewCameriere):
         """Show solution button click function."""
         return (
             toggle_buttons_interactivity(done=True)
             + [
                 gr.update(
                     value=rc.current_back(),
-                    label=TRAD_LABEL if rc.foreign_in_front else ITA_LABEL
+                    label=trad_label(rc.languages) if rc.foreign_in_front else ITA_LABEL
                 )
             ]
         )
@@ -37,28 +71,103 @@ def solution_click(rc: "ReviewCameriere"):
     return solution_fn
 
 
-def feedback_click(
-    rc: "ReviewCameriere",
-    is_error: bool,
-    update: bool,
-):
-    def feedback_fn():
-        """Feedback button click function."""
-        ss_states_update = rc.next(is_error, update=update)
-
-        rc.ss_states.row_iat.value = ss_states_update[0]
-        rc.ss_states.S.value = ss_states_update[1]
-        rc.ss_states.SS.value = ss_states_update[2]
+def feedback_click(is_error: bool, update: bool):
+    event = "feedback.neutral" if not update else "feedback.not_ok" if is_error else "feedback.ok"
 
+    @timed("ui.feedback_click")
+    def feedback_fn(rc: ReviewCameriere):
+        """Feedback button click function.
+        The next card was prefetched, so this only has to swap it in.
+        """
+        count(event)
+        rc.next(is_error, update=update)
         return (
-            ss_states_update
+            [rc]
             + toggle_buttons_interactivity(done=False)
-            + [
-                gr.update(
-                    value=rc.current_front(),
-                    label=ITA_LABEL if rc.foreign_in_front else TRAD_LABEL
-                )
-            ]
+            + [front_update(rc)]
         )
 
     return feedback_fn
+
+
+def answer_submit():
+    @timed("ui.answer_submit")
+    def answer_fn(rc: ReviewCameriere, typed: str):
+        """Typed answer submit function, which grades the answer and moves to the next card.
+        The graded card's solution is shown in the answer's label.
+        """
+        if not typed.strip():
+            return [rc] + [gr.update()] * 6
+        is_error = not rc.check_answer(typed)
+        count("answer.not_ok" if is_error else "answer.ok")
+        solution = rc.current_back()
+        rc.next(is_error, update=True)
+        return (
+            [rc]
+            + toggle_buttons_interactivity(done=False)
+            + [front_update(rc)]
+            + [gr.update(value="", label=f"{'❌' if is_error else '✅'} {solution}")]
+        )
+
+    return answer_fn
+
+
+def prefetch_next():
+    def prefetch_fn(rc: ReviewCameriere) -> None:
+        """Prefetch the next card, once the current one is shown."""
+        rc.prefetch()
+
+    return prefetch_fn
+
+
+def search_input(deck: "Deck"):
+    def search_fn(query: str):
+        """Search box input function, run on every keystroke."""
+        results = deck.search(query)
+        if results is None:
+            return gr.update(label="Cerca: indice in costruzione... ⏳")
+        return gr.update(value=results, label=f"Cerca: {len(results)} risultati")
+
+    return search_fn
+
+
+def stats_show(deck: "Deck"):
+    def stats_fn():
+        """Stats tab select and refresh function. Aggregates are kept up to date by
+        the grades, so this only formats them.
+        """
+        return list(deck.stats_tables())
+
+    return stats_fn
+
+
+def display_change():
+    def display_fn(rc: ReviewCameriere, direction: int, languages: list[str]):
+        """Direction radio and language checkboxes change function.
+        The words are looked up again, so the deck is not reloaded.
+        """
+        rc.set_display(foreign_in_front=bool(direction), languages=languages)
+        return (
+            [rc]
+            + toggle_buttons_interactivity(done=False)
+            + [front_update(rc)]
+        )
+
+    return display_fn
+
+
+def deck_version_tick(deck: "Deck"):
+    def version_fn(version: int) -> int:
+        """Timer function, which only changes the deck version after a reload."""
+        return deck.version
+
+    return version_fn
+
+
+def selection_change(sections: list["Section"]):
+    def selection_fn(rc: ReviewCameriere, *selected: list[str]):
+        """Subsection checkboxes change function."""
+        rc.set_selection(dict(zip(sections, selected)))
+        return rc
+
+    return selection_fn
@@ -0,0 +1,131 @@
+"""Prepared glossary cache functions.
+
+The cache of glossary `<name>` lives in `cache/<name>/`: one `.npy` file per column
+of the prepared vocabulary DataFrame, plus a `meta.json` file holding the cache key,
+sections, subsections and counts. Text columns are stored as their concatenated UTF-8
+text and the offsets of each cell in it, so a long cell does not widen the others.
+Rows are stored in section order, so each section is a contiguous partition whose
+row offsets are saved as `sezione_offsets`.
+"""
+
+import json
+import os
+from itertools import pairwise
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from classes import Section, Subsection
+
+CACHE_VERSION = 5
+CACHE_DIR = "cache"
+META_FILE = "meta.json"
+
+
+def cache_key(src_path: str) -> dict:
+    """Cache key of a glossary CSV, invalidated whenever the file changes."""
+    stat = os.stat(src_path)
+    return {"version": CACHE_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _col_path(cache_dir: str, col: str, suffix: str = "") -> str:
+    return os.path.join(cache_dir, f"{col}{suffix}.npy")
+
+
+def _save_column(cache_dir: str, col: str, ser: pd.Series) -> None:
+    """Save a column as an array, or as its text and offsets plus a null mask for
+    text columns.
+    """
+    if ser.dtype != object:
+        np.save(_col_path(cache_dir, col), ser.to_numpy())
+        return
+
+    mask = ser.isna().to_numpy()
+    cells = ser.fillna("").astype(str).to_list()
+    offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum([len(cell) for cell in cells], out=offsets[1:])
+    text = "".join(cells).encode("utf-8")
+    np.save(_col_path(cache_dir, col, ".utf8"), np.frombuffer(text, dtype=np.uint8))
+    np.save(_col_path(cache_dir, col, ".offsets"), offsets)
+    if mask.any():
+        np.save(_col_path(cache_dir, col, ".null"), mask)
+
+
+def _load_column(cache_dir: str, col: str) -> pd.Series:
+    if not os.path.exists(_col_path(cache_dir, col, ".offsets")):
+        return pd.Series(np.load(_col_path(cache_dir, col)), name=col)
+
+    # Offsets count characters, so the cells are sliced from the decoded text
+    text = np.load(_col_path(cache_dir, col, ".utf8")).tobytes().decode("utf-8")
+    offsets = np.load(_col_path(cache_dir, col, ".offsets")).tolist()
+    ser = pd.Series(
+        [text[start:end] for start, end in pairwise(offsets)],
+        name=col,
+        dtype=object,
+    )
+    mask_path = _col_path(cache_dir, col, ".null")
+    if os.path.exists(mask_path):
+        ser[np.load(mask_path)] = np.nan
+    return ser
+
+
+def write_cache(
+    name: str,
+    src_path: str,
+    df: pd.DataFrame,
+    sections: list["Section"],
+    subsections: dict["Section", list["Subsection"]],
+    sss_counts: list[list[int]],
+) -> None:
+    """Write the prepared glossary to the cache."""
+    cache_dir = os.path.join(CACHE_DIR, name)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # The metadata file is written last, so a half-written cache is never valid
+    meta_path = os.path.join(cache_dir, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    # Files of columns which are gone, or stored differently, would be left behind
+    for file_name in os.listdir(cache_dir):
+        os.remove(os.path.join(cache_dir, file_name))
+
+    for col in df.columns:
+        _save_column(cache_dir, col, df[col])
+
+    meta = {
+        "key": cache_key(src_path),
+        "columns": df.columns.to_list(),
+        "sections": sections,
+        "subsections": subsections,
+        "sss_counts": sss_counts,
+        "sezione_offsets": np.cumsum([0] + [sum(counts) for counts in sss_counts]).tolist(),
+    }
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def read_cache(
+    name: str,
+    src_path: str,
+) -> tuple[
+    pd.DataFrame,
+    list["Section"],
+    dict["Section", list["Subsection"]],
+    list[list[int]],
+] | None:
+    """Read the prepared glossary from the cache. Returns None if missing or outdated."""
+    meta_path = os.path.join(CACHE_DIR, name, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta["key"] != cache_key(src_path):
+        return None
+
+    cache_dir = os.path.join(CACHE_DIR, name)
+    df = pd.concat([_load_column(cache_dir, col) for col in meta["columns"]], axis=1)
+    return df, meta["sections"], meta["subsections"], meta["sss_counts"]
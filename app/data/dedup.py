@@ -0,0 +1,160 @@
+"""Near-duplicate detection of glossary words.
+
+Words are normalized (case, accents, whitespace and leading articles), so that
+"Perché", "perche" and "il perché" share the same form. Similar words are found
+with MinHash signatures of their character trigrams: words sharing a band of the
+signature become candidates, and candidates are kept if the Jaccard similarity of
+their trigrams is high enough. This takes roughly linear time, as no pair of words
+is compared unless it shares a band.
+"""
+
+import re
+import unicodedata
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from options import COLUMN
+
+ARTICLES_PATT = re.compile(r"^(?:(?:il|lo|la|i|gli|le|un|uno|una)\s+|(?:l|un)'\s*)")
+ACCENTS_PATT = re.compile(r"[\u0300-\u036f]")  # Combining accents, once decomposed
+APOSTROPHES_PATT = re.compile(r"[\u2019`\u00b4]")
+SPACES_PATT = re.compile(r"\s+")
+
+N_HASHES = 36
+ROWS_PER_BAND = 3  # Words sharing a band are likely to have a similarity above ~0.5
+MAX_BUCKET_SIZE = 20  # Larger buckets are common patterns, not duplicates
+MIN_SIMILARITY = 0.5
+ESTIMATE_MARGIN = 0.2
+CHUNK_SIZE = 50_000
+BOUNDARY = "\x01"
+
+RNG_SEED = 42
+_rng = np.random.default_rng(RNG_SEED)
+HASH_A = _rng.integers(1, 2 ** 63, size=N_HASHES, dtype=np.uint64) | np.uint64(1)
+HASH_B = _rng.integers(0, 2 ** 63, size=N_HASHES, dtype=np.uint64)
+
+REPORT_COLS = [
+    f"{COLUMN.ITALIAN}_1", f"{COLUMN.SECTION}_1", f"{COLUMN.SUBSECTION}_1",
+    f"{COLUMN.ITALIAN}_2", f"{COLUMN.SECTION}_2", f"{COLUMN.SUBSECTION}_2",
+    "motivo", "somiglianza",
+]
+
+
+def normalize_word(word: str, articles_patt: re.Pattern = ARTICLES_PATT) -> str:
+    """Normalize a word: lowercase, without accents, leading articles nor extra whitespace."""
+    word = ACCENTS_PATT.sub("", unicodedata.normalize("NFKD", word)).lower()
+    word = SPACES_PATT.sub(" ", APOSTROPHES_PATT.sub("'", word)).strip()
+    return articles_patt.sub("", word)
+
+
+def normalize_words(words: pd.Series) -> pd.Series:
+    return words.astype(str).map(normalize_word)
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"{BOUNDARY}{word}{BOUNDARY}"
+    return {padded[i:i + 3] for i in range(max(len(padded) - 2, 1))}
+
+
+def minhash_signatures(forms: np.ndarray) -> np.ndarray:
+    """MinHash signatures (n_words, N_HASHES) of the character trigrams of each form.
+    Trigrams are encoded from the words' code points, a chunk of words at a time.
+    """
+    signatures = np.empty((forms.size, N_HASHES), dtype=np.uint32)
+    for start in range(0, forms.size, CHUNK_SIZE):
+        chunk = np.char.add(np.char.add(BOUNDARY, forms[start:start + CHUNK_SIZE].astype(str)), BOUNDARY)
+        lengths = np.char.str_len(chunk)
+        width = max(int(lengths.max()), 3)
+        codes = chunk.astype(f"<U{width}").view(np.uint32).reshape(-1, width).astype(np.uint64)
+
+        grams = (codes[:, :-2] << np.uint64(42)) | (codes[:, 1:-1] << np.uint64(21)) | codes[:, 2:]
+        valid = np.arange(width - 2) < np.maximum(lengths - 2, 1)[:, None]
+
+        for k in range(N_HASHES):
+            # Multiply-shift hashing, overflowing on purpose
+            hashes = (grams * HASH_A[k] + HASH_B[k]) >> np.uint64(32)
+            hashes[~valid] = np.iinfo(np.uint32).max
+            signatures[start:start + chunk.size, k] = hashes.min(axis=1)
+
+    return signatures
+
+
+def candidate_pairs(signatures: np.ndarray) -> set[tuple[int, int]]:
+    """Pairs of rows whose signatures share at least a band.
+    Buckets are capped, so each row is paired with fewer than `MAX_BUCKET_SIZE` rows per band.
+    """
+    pairs = set()
+    for band in range(N_HASHES // ROWS_PER_BAND):
+        keys = np.zeros(signatures.shape[0], dtype=np.uint64)
+        for col in range(band * ROWS_PER_BAND, (band + 1) * ROWS_PER_BAND):
+            keys = keys * HASH_A[col] ^ signatures[:, col].astype(np.uint64)
+
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, keys.size])
+
+        is_candidate = (sizes > 1) & (sizes <= MAX_BUCKET_SIZE)
+        for start, size in zip(starts[is_candidate], sizes[is_candidate]):
+            pairs.update(combinations(sorted(order[start:start + size].tolist()), 2))
+    return pairs
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b)
+
+
+def find_near_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """Find the merge candidates of a glossary, with their sections.
+    Words with the same normalized form are reported as "normalizzata", each against
+    the first of them, and words whose trigrams are similar enough as "simile", each
+    form once.
+    """
+    forms = normalize_words(df[COLUMN.ITALIAN])
+
+    rows = []
+    same_form = forms[forms.duplicated(keep=False)]
+    for first, *others in same_form.groupby(same_form, sort=False).groups.values():
+        rows += [(first, j, "normalizzata", 1.0) for j in others]
+
+    # Repeated forms would fill the buckets of the bands, so each form is hashed once
+    is_first = ~forms.duplicated().to_numpy()
+    forms_arr = forms.to_numpy()[is_first]
+    index = df.index[is_first]
+    signatures = minhash_signatures(forms_arr)
+    pairs = np.array(sorted(candidate_pairs(signatures)), dtype=np.int64).reshape(-1, 2)
+
+    # The share of equal MinHashes estimates the similarity, so most pairs are discarded at once
+    estimate = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+    pairs = pairs[estimate >= MIN_SIMILARITY - ESTIMATE_MARGIN]
+
+    for i, j in pairs.tolist():
+        similarity = jaccard(trigrams(forms_arr[i]), trigrams(forms_arr[j]))
+        if similarity >= MIN_SIMILARITY:
+            rows.append((index[i], index[j], "simile", round(similarity, 3)))
+
+    cols = [COLUMN.ITALIAN, COLUMN.SECTION, COLUMN.SUBSECTION]
+    left = df.loc[[r[0] for r in rows], cols].to_numpy()
+    right = df.loc[[r[1] for r in rows], cols].to_numpy()
+    report = pd.DataFrame(
+        np.hstack([left.reshape(-1, 3), right.reshape(-1, 3)]),
+        columns=REPORT_COLS[:6],
+    )
+    report["motivo"] = [r[2] for r in rows]
+    report["somiglianza"] = [r[3] for r in rows]
+    return report.sort_values("somiglianza", ascending=False, ignore_index=True)
+
+
+def duplicates_report_path(name: str) -> str:
+    return f"{name}_duplicates.csv"
+
+
+def report_near_duplicates(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Write the merge candidates of a glossary to a CSV report. Rows are not dropped."""
+    report = find_near_duplicates(df)
+    if not report.empty:
+        report.to_csv(duplicates_report_path(name), index=False, sep=";")
+        print(f"FOUND {report.shape[0]} NEAR-DUPLICATE CANDIDATES: see {duplicates_report_path(name)}")
+    return report
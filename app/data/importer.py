@@ -0,0 +1,193 @@
+"""Importer of external decks into glossaries.
+
+TSV files (with a header naming the glossary columns) and Anki plain-text
+exports are read a chunk of rows at a time: each chunk is mapped onto the
+glossary columns, deduplicated against the ids of the words already written and
+appended to the new glossary file. Only the set of ids grows with the file, so
+memory is bounded by the chunk size.
+"""
+
+import html
+import os
+import re
+from collections.abc import Iterator
+
+import numpy as np
+import pandas as pd
+
+from data.loading import GLOSSARY_COLS, glossary_path, open_prepared_glossary
+from data.utils import add_word_ids
+from metrics import timed
+from options import COLUMN, FORMAT
+
+CHUNK_SIZE = 10_000
+SKIP = "-"  # Field mapped to no column
+DECK = "deck"  # Anki deck field, split as "<section>::<subsection>"
+DECK_SEP = "::"
+DEFAULT_SUBSECTION = "Generale"
+OUTPUT_COLS = GLOSSARY_COLS + [COLUMN.WORD_ID]
+FIELD_NAMES = OUTPUT_COLS + [DECK]
+
+ANKI_FIELDS = [COLUMN.ITALIAN, COLUMN.ENGLISH]  # Front and back of the basic note type
+ANKI_META = ["guid", "notetype", "deck", "tags"]
+ANKI_HEADER_PATT = re.compile(r"^#([a-z ]+):(.*)$")
+ANKI_SEPARATORS = {"tab": "\t", "comma": ",", "semicolon": ";", "pipe": "|", "space": " "}
+MARKUP_PATT = re.compile(r"<[^>]*>|\[sound:[^\]]*\]")
+
+
+def detect_format(path: str) -> str:
+    """Anki exports start with `#key:value` header lines."""
+    with open(path, encoding="utf-8") as f:
+        return FORMAT.ANKI if ANKI_HEADER_PATT.match(f.readline().rstrip("\n")) else FORMAT.TSV
+
+
+def read_anki_header(path: str) -> dict[str, str]:
+    """Header options of an Anki export, such as `separator` or `deck column`."""
+    options = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            match = ANKI_HEADER_PATT.match(line.rstrip("\n"))
+            if match is None:
+                break
+            options[match[1]] = match[2]
+    return options
+
+
+def anki_fields(options: dict[str, str]) -> dict[int, str]:
+    """Glossary column of each field of an Anki export. Fields named like a glossary
+    column keep their name and the deck field gives the sections; otherwise the
+    first two note fields are the Italian word and its English translation.
+    """
+    meta = {int(options[f"{key} column"]) - 1 for key in ANKI_META if f"{key} column" in options}
+    names = [name.strip().lower() for name in options["columns"].split("\t")] if "columns" in options else []
+    fields = {i: name for i, name in enumerate(names) if name in OUTPUT_COLS}
+    if not fields:
+        note_cols = [i for i in range(len(meta) + len(ANKI_FIELDS)) if i not in meta]
+        fields = dict(zip(note_cols, ANKI_FIELDS))
+    if "deck column" in options:
+        fields[int(options["deck column"]) - 1] = DECK
+    return fields
+
+
+def parse_fields(fields: list[str]) -> dict[int, str]:
+    """Mapping given as one column name per field, with `-` for the skipped fields."""
+    assert all(field in FIELD_NAMES + [SKIP] for field in fields), f"Fields must be in {FIELD_NAMES} or '{SKIP}'"
+    return {i: field for i, field in enumerate(fields) if field != SKIP}
+
+
+def read_chunks(path: str, sep: str, skiprows: int, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Raw fields of the rows, as strings, a chunk at a time."""
+    return pd.read_csv(
+        path,
+        sep=sep,
+        header=None,
+        skiprows=skiprows,
+        dtype=str,
+        na_filter=False,
+        chunksize=chunk_size,
+        encoding="utf-8",
+    )
+
+
+def map_chunk(
+    chunk: pd.DataFrame,
+    fields: dict[int, str],
+    section: str,
+    subsection: str,
+    strip_markup: bool,
+) -> pd.DataFrame:
+    """Map the raw fields of a chunk onto the glossary columns."""
+    df = pd.DataFrame(index=chunk.index)
+    for i, col in fields.items():
+        if i not in chunk:
+            continue
+        values = chunk[i]
+        if strip_markup:
+            values = values.str.replace(MARKUP_PATT, "", regex=True).map(html.unescape)
+        values = values.str.strip()
+
+        if col == DECK:
+            parent, _, last = values.str.rpartition(DECK_SEP).T.to_numpy()
+            has_parent = parent != ""
+            df[COLUMN.SECTION] = np.where(has_parent, parent, last)
+            df[COLUMN.SUBSECTION] = np.where(has_parent, last, subsection)
+        else:
+            df[col] = values
+
+    for col, default in [
+        (COLUMN.ITALIAN, ""), (COLUMN.CEFR, ""), *[(lang, "") for lang in COLUMN.LANGUAGES],
+        (COLUMN.SECTION, section), (COLUMN.SUBSECTION, subsection),
+    ]:
+        if col not in df:
+            df[col] = default
+        elif default:
+            df[col] = df[col].mask(df[col] == "", default)
+
+    df = df[df[COLUMN.ITALIAN] != ""]
+    if COLUMN.WORD_ID in df:
+        df[COLUMN.WORD_ID] = pd.to_numeric(df[COLUMN.WORD_ID].replace("", None), dtype_backend="numpy_nullable")
+    add_word_ids(df)
+    return df[OUTPUT_COLS]
+
+
+@timed("import_deck")
+def import_deck(
+    src_path: str,
+    name: str,
+    fmt: str | None = None,
+    fields: list[str] | None = None,
+    section: str | None = None,
+    subsection: str = DEFAULT_SUBSECTION,
+    chunk_size: int = CHUNK_SIZE,
+    prepare: bool = False,
+) -> int:
+    """Import a TSV file or an Anki export as the glossary `name`, streaming it a chunk
+    at a time, and return the number of words imported.
+    Words are deduplicated on their ids, keeping the first one. Without `fields`, TSV
+    columns are mapped by their header and Anki fields by `anki_fields`. Rows without
+    section get `section` (the glossary name by default). If `prepare`, the prepared
+    glossary cache is written too.
+    """
+    path = glossary_path(name)
+    assert not os.path.exists(path), f"Glossary already exists: '{path}'"
+    fmt = fmt or detect_format(src_path)
+    assert fmt in FORMAT.ALL, f"Format not recognized: '{fmt}'"
+    section = section or name
+
+    if fmt == FORMAT.ANKI:
+        options = read_anki_header(src_path)
+        sep = ANKI_SEPARATORS.get(options.get("separator", "tab"), options.get("separator", "\t"))
+        skiprows = len(options)
+        strip_markup = options.get("html", "false") == "true"
+        mapping = parse_fields(fields) if fields else anki_fields(options)
+    else:
+        sep, skiprows, strip_markup = "\t", 1, False
+        if fields is None:
+            with open(src_path, encoding="utf-8") as f:
+                header = f.readline().rstrip("\n").split(sep)
+            fields = [col.strip() if col.strip() in FIELD_NAMES else SKIP for col in header]
+        mapping = parse_fields(fields)
+    assert COLUMN.ITALIAN in mapping.values(), "No field is mapped to the Italian words."
+
+    seen: set[int] = set()
+    n_read = n_written = 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8", newline="") as f:
+        f.write(";".join(OUTPUT_COLS) + "\n")
+        for chunk in read_chunks(src_path, sep, skiprows, chunk_size):
+            n_read += chunk.shape[0]
+            df = map_chunk(chunk, mapping, section, subsection, strip_markup)
+
+            ids = df[COLUMN.WORD_ID].tolist()
+            is_new = np.fromiter((i not in seen for i in ids), dtype=bool, count=len(ids))
+            is_new &= ~df[COLUMN.WORD_ID].duplicated().to_numpy()
+            seen.update(df[COLUMN.WORD_ID].to_numpy()[is_new].tolist())
+
+            df[is_new].to_csv(f, sep=";", header=False, index=False)
+            n_written += int(is_new.sum())
+    os.replace(f"{path}.tmp", path)
+
+    print(f"IMPORTED {n_written} WORDS OF {n_read} ROWS INTO {path}")
+    if prepare:
+        open_prepared_glossary(name)
+    return n_written
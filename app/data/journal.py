@@ -0,0 +1,269 @@
+"""Review journal functions.
+
+Every grade is appended to `history/<name>.log`, so a crash only loses the events
+that were not yet synced. The history CSV is the compacted snapshot: compaction
+renames the log to `history/<name>.log.compacting`, folds it into the snapshot
+through `history/<name>.csv.tmp` and deletes the segment before replacing the CSV.
+"""
+
+import csv
+import datetime as dt
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+from data.utils import add_word_ids
+from options.COLUMN import ITALIAN, WORD_ID
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+HISTORY_COLS = [WORD_ID, ITALIAN, "ok", "not_ok", "last_ok", "last_not_ok"]
+# Journals written before word ids have no id column
+JOURNAL_COLS = [ITALIAN, "status", "timestamp", WORD_ID]
+
+
+def history_path(glossary_name: str) -> str:
+    return f"history/{glossary_name}.csv"
+
+
+def journal_path(glossary_name: str) -> str:
+    return f"history/{glossary_name}.log"
+
+
+class ReviewJournal:
+    """Append-only log of the grades of a glossary, with buffered writes.
+    Grades are buffered and appended to the log every `fsync_every` grades, and by
+    `flush` once the grades stop coming, so no grade stays unsynced for much longer
+    than `fsync_interval`.
+    """
+    def __init__(
+        self,
+        glossary_name: str,
+        fsync_every: int = 20,
+        fsync_interval: float = 5.0,
+        compact_every: int = 1000,
+    ):
+        self.glossary_name = glossary_name
+        self.path = journal_path(glossary_name)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self._buffer: list[list] = []
+        self._lock = threading.Lock()
+        self._compaction: threading.Thread | None = None
+
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._since_rotation = 0
+
+    def _sync(self) -> None:
+        if self._buffer:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", newline="") as f:
+                csv.writer(f, delimiter=";").writerows(self._buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            self._buffer.clear()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def record(self, word: str, word_id: int, is_error: bool, timestamp: dt.datetime) -> None:
+        """Append a grade to the journal. It is synced to disk periodically."""
+        with self._lock:
+            self._buffer.append([word, "not_ok" if is_error else "ok", timestamp.isoformat(), word_id])
+
+            self._unsynced += 1
+            self._since_rotation += 1
+            if (
+                self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync()
+
+        if self._since_rotation >= self.compact_every:
+            self.compact_in_background()
+
+    def flush(self) -> None:
+        """Sync the grades written since the last sync, if any."""
+        with self._lock:
+            if self._unsynced > 0:
+                self._sync()
+
+    def _rotate(self) -> bool:
+        """Move the current log to the compaction segment."""
+        with self._lock:
+            self._sync()
+            if not os.path.exists(self.path):
+                return False
+            os.rename(self.path, f"{self.path}.compacting")
+            self._since_rotation = 0
+        return True
+
+    def _compact(self) -> None:
+        # A segment left by an interrupted compaction goes first
+        if os.path.exists(f"{self.path}.compacting"):
+            compact_segment(self.glossary_name)
+        if self._rotate():
+            compact_segment(self.glossary_name)
+
+    def compact_in_background(self) -> None:
+        """Fold the current log into the history snapshot in a background thread."""
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self._compact, daemon=True)
+        self._compaction.start()
+
+    def close(self) -> None:
+        """Sync and close the journal, waiting for any running compaction."""
+        with self._lock:
+            self._sync()
+        if self._compaction is not None:
+            self._compaction.join()
+
+
+# * Replay
+
+
+def read_journal(path: str) -> "DataFrame":
+    """Read a journal file. A truncated last line is ignored."""
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=JOURNAL_COLS)
+
+    df = pd.read_csv(
+        path,
+        sep=";",
+        names=JOURNAL_COLS,
+        header=None,
+        dtype={WORD_ID: "Int64"},
+        on_bad_lines="skip",
+    )
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df = df.dropna(subset=["status", "timestamp"])
+    add_word_ids(df)
+    return df
+
+
+def read_journal_tail(glossary_name: str) -> "DataFrame":
+    """Read the events not yet folded into the history snapshot."""
+    path = journal_path(glossary_name)
+    paths = [p for p in [f"{path}.compacting", path] if os.path.exists(p)]
+    if not paths:
+        return pd.DataFrame(columns=JOURNAL_COLS)
+    return pd.concat([read_journal(p) for p in paths], ignore_index=True)
+
+
+def fold_events(df_history: "DataFrame", df_events: "DataFrame") -> "DataFrame":
+    """Fold journal events into the aggregate history table."""
+    if df_events.empty:
+        return df_history
+
+    is_ok = df_events["status"] == "ok"
+    dates = df_events["timestamp"].dt.normalize()
+    df_agg = (
+        pd.DataFrame({
+            WORD_ID: df_events[WORD_ID],
+            ITALIAN: df_events[ITALIAN],
+            "ok": is_ok.astype(int),
+            "not_ok": (~is_ok).astype(int),
+            "last_ok": dates.where(is_ok),
+            "last_not_ok": dates.where(~is_ok),
+        })
+        .groupby(WORD_ID, as_index=False)
+        .agg({ITALIAN: "last", "ok": "sum", "not_ok": "sum", "last_ok": "max", "last_not_ok": "max"})
+    )
+
+    df = df_history.merge(df_agg, how="outer", on=WORD_ID, suffixes=("", "_new"))
+    # A word keeps its id when its spelling is corrected, so the latest spelling wins
+    df[ITALIAN] = df.pop(f"{ITALIAN}_new").fillna(df[ITALIAN])
+    today = pd.to_datetime(dt.date.today())
+    for col in ["ok", "not_ok"]:
+        df[col] = df[col].fillna(0).astype(int) + df.pop(f"{col}_new").fillna(0).astype(int)
+    for col in ["last_ok", "last_not_ok"]:
+        df[col] = df[[col, f"{col}_new"]].max(axis=1).fillna(today)
+        df.pop(f"{col}_new")
+
+    return df[HISTORY_COLS]
+
+
+# * Compaction
+
+
+def empty_history() -> "DataFrame":
+    return pd.DataFrame({
+        WORD_ID: pd.Series(dtype="int64"),
+        ITALIAN: pd.Series(dtype=object),
+        "ok": pd.Series(dtype=int),
+        "not_ok": pd.Series(dtype=int),
+        "last_ok": pd.Series(dtype="datetime64[ns]"),
+        "last_not_ok": pd.Series(dtype="datetime64[ns]"),
+    })
+
+
+def read_snapshot(glossary_name: str) -> "DataFrame":
+    path_history = history_path(glossary_name)
+    if not os.path.exists(path_history):
+        return empty_history()
+
+    # Snapshots are written with all their ids, so they are parsed as plain integers
+    df_history = pd.read_csv(path_history)
+    df_history["last_ok"] = pd.to_datetime(df_history["last_ok"])
+    df_history["last_not_ok"] = pd.to_datetime(df_history["last_not_ok"])
+    # Histories saved before word ids only have the words
+    add_word_ids(df_history)
+    return df_history[HISTORY_COLS]
+
+
+def recover_journal(glossary_name: str) -> None:
+    """Finish or roll back a compaction that was interrupted by a crash.
+    The compaction segment is deleted only once the new snapshot is fully written.
+    """
+    path_tmp = f"{history_path(glossary_name)}.tmp"
+    if not os.path.exists(path_tmp):
+        return
+    if os.path.exists(f"{journal_path(glossary_name)}.compacting"):
+        os.remove(path_tmp)
+    else:
+        os.replace(path_tmp, history_path(glossary_name))
+
+
+def compact_segment(glossary_name: str) -> None:
+    """Fold the compaction segment into the history snapshot."""
+    segment = f"{journal_path(glossary_name)}.compacting"
+    path_history = history_path(glossary_name)
+    path_tmp = f"{path_history}.tmp"
+
+    df_history = fold_events(read_snapshot(glossary_name), read_journal(segment))
+    with open(path_tmp, "w", newline="") as f:
+        df_history.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.remove(segment)
+    os.replace(path_tmp, path_history)
+
+
+def compact_journal(glossary_name: str) -> None:
+    """Fold the whole journal into the history snapshot. The journal must be closed."""
+    recover_journal(glossary_name)
+    segment = f"{journal_path(glossary_name)}.compacting"
+    if os.path.exists(segment):
+        compact_segment(glossary_name)
+
+    path = journal_path(glossary_name)
+    if os.path.exists(path):
+        os.rename(path, segment)
+        compact_segment(glossary_name)
+    print("History saved succesfully.")
+
+
+def clear_journal(glossary_name: str) -> None:
+    """Delete the journal files, once their events are stored elsewhere."""
+    path = journal_path(glossary_name)
+    for p in [path, f"{path}.compacting", f"{history_path(glossary_name)}.tmp"]:
+        if os.path.exists(p):
+            os.remove(p)
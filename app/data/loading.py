@@ -1,125 +1,198 @@
 """Module for data handling."""
 
+import datetime as dt
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
 
+from data.cache import read_cache, write_cache
+from data.journal import fold_events, read_journal_tail, read_snapshot, recover_journal
 from data.utils import (
+    add_word_ids,
     check_glossary_duplicates,
     check_history_duplicates,
-    concat_langs,
-    handle_ok_nulls,
-    loop_add_ids,
-    init_empty_history,
-    init_sss_counts,
+    get_sss_ids,
+    get_sss_starts,
     init_vocab_df,
-    process_sections,
-    process_sections_subsections,
+    join_ids,
 )
-from options import COLUMN  # TODO
+from metrics import count, span, timed
+from options import COLUMN
 
 if TYPE_CHECKING:
+    from numpy import ndarray
+
     from classes import Section, Subsection
 
 NAME_PATT = re.compile(r"^[a-z][a-z0-9\-\_]*[a-z0-9]$", re.IGNORECASE)
-GLOSSARY_COLS = [COLUMN.ITALIAN, COLUMN.CEFR, COLUMN.SPANISH, COLUMN.ENGLISH, COLUMN.SECTION, COLUMN.SUBSECTION]
+GLOSSARY_COLS = [COLUMN.ITALIAN, COLUMN.CEFR, *COLUMN.LANGUAGES, COLUMN.SECTION, COLUMN.SUBSECTION]
 
 
-def load_glossary_df(name: str) -> pd.DataFrame:
-    """Load and preprocess glossary DataFrame."""
-    df = pd.read_csv(f"glossary/{name}.csv", usecols=GLOSSARY_COLS, sep=";")
-    had_duplicates = check_glossary_duplicates(df)
+def glossary_path(name: str) -> str:
+    assert NAME_PATT.match(name)
+    return f"glossary/{name}.csv"
 
-    # TODO: Implement language selection
-    df[COLUMN.TRANSLATION] = df[[COLUMN.SPANISH, COLUMN.ENGLISH]].apply(concat_langs, axis=1)
 
-    df = df.sort_values([COLUMN.SECTION, COLUMN.SUBSECTION, COLUMN.ITALIAN], ignore_index=True)
+def read_glossary_csv(name: str) -> pd.DataFrame:
+    """Read the glossary columns, and the word ids if the file has them. The history
+    of each word follows its id, or its spelling if the file has none.
+    """
+    return pd.read_csv(
+        glossary_path(name),
+        usecols=lambda col: col in GLOSSARY_COLS or col == COLUMN.WORD_ID,
+        dtype={COLUMN.WORD_ID: "Int64"},
+        sep=";",
+    )
+
+
+def load_glossary_df(name: str) -> pd.DataFrame:
+    """Load and preprocess glossary DataFrame.
+    Each language keeps its own column, and their translations are joined by the card store.
+    """
+    with span("open_glossary.read"):
+        df = read_glossary_csv(name)
+    with span("open_glossary.word_ids"):
+        add_word_ids(df)
+    with span("open_glossary.dedup"):
+        had_duplicates = check_glossary_duplicates(df)
+
+    # Languages missing from the file, or without any translation, are empty text columns
+    for lang in COLUMN.LANGUAGES:
+        df[lang] = df[lang].astype(object) if lang in df else pd.Series(np.nan, index=df.index, dtype=object)
+
+    with span("open_glossary.sort"):
+        df = df.sort_values([COLUMN.SECTION, COLUMN.SUBSECTION, COLUMN.ITALIAN], ignore_index=True)
     if had_duplicates:
-        df[GLOSSARY_COLS].to_csv("new_glossario.csv", index=False, sep=";")
+        df[GLOSSARY_COLS + [COLUMN.WORD_ID]].to_csv("new_glossario.csv", index=False, sep=";")
         print("Glossary without duplicates saved.")
 
-    df = df.drop([COLUMN.SPANISH, COLUMN.ENGLISH], axis=1)
     return df
 
 
+@timed("open_glossary.sections")
 def create_sections_subsections(
     df: pd.DataFrame
 ) -> tuple[
     list["Section"],
     dict["Section", list["Subsection"]],
-    dict["Section", pd.DataFrame]
+    tuple["ndarray", "ndarray"],
 ]:
     """Create sections and subsections of the vocabulary.
+    Also returns the row indices where each section and each subsection start.
     NOTE: df must already be alphabetically ordered.
     """
-    df_sss, n_ss = process_sections_subsections(df)
-    sections, ixs, ixs_next = process_sections(df_sss)
-    aux_dfs = {
-        s: df_sss.iloc[ix:(n_ss if ix_next == -1 else ix_next)]
-        for s, ix, ix_next in zip(sections, ixs, ixs_next)
-    }
-    subsections = {s: df_aux["sottosezione"].to_list() for s, df_aux in aux_dfs.items()}
-    return sections, subsections, aux_dfs
-
-
-def get_ixs(
-    aux_dfs: dict["Section", pd.DataFrame]
-) -> tuple[dict["Section", list[int]], list[int], list[int]]:
-    """Get indices for the add_ids_to_vocab_df function."""
-    orig_ixs = {s: df_aux.index.to_list() for s, df_aux in aux_dfs.items()}
-    start_ixs = [s_ixs[0] for s_ixs in orig_ixs.values()]
-    next_start_ixs = start_ixs[1:] + [-1]
-    return orig_ixs, start_ixs, next_start_ixs
+    s_starts, ss_starts = get_sss_starts(df)
+    first_ss = np.searchsorted(ss_starts, s_starts)
+
+    sections = df[COLUMN.SECTION].iloc[s_starts].to_list()
+    ss_lists = np.split(df[COLUMN.SUBSECTION].to_numpy()[ss_starts], first_ss[1:])
+    subsections = {s: ss_list.tolist() for s, ss_list in zip(sections, ss_lists)}
 
+    return sections, subsections, (s_starts, ss_starts)
 
+
+@timed("open_glossary.ids")
 def add_ids_to_vocab_df(
     df: pd.DataFrame,
-    orig_ixs: dict["Section", list[int]],
-    start_ixs: list[int],
-    next_start_ixs: list[int],
-    subsections: dict["Section", list["Subsection"]],
+    sss_starts: tuple["ndarray", "ndarray"],
 ) -> tuple[pd.DataFrame, list[list[int]]]:
     """Add section and subsection ids to vocabulary df.
     NOTE: df must already be alphabetically ordered.
     """
     df = init_vocab_df(df)
-    sss_counts, sid_col_iat, ssid_col_iat = init_sss_counts(df, subsections)
+    s_ids, ss_ids, sss_counts = get_sss_ids(df.shape[0], *sss_starts)
 
-    # We modify the original DataFrame with the information we now know
-    zip_loop = enumerate(zip(orig_ixs.values(), start_ixs, next_start_ixs))
-    loop_add_ids(df, zip_loop, sid_col_iat, ssid_col_iat, sss_counts)
+    df["sezione_id"] = s_ids
+    df["sottosezione_id"] = ss_ids
 
     return df, sss_counts
 
 
+def merge_history(df: pd.DataFrame, df_history: pd.DataFrame) -> pd.DataFrame:
+    """Merge the history DataFrame with the vocabulary DataFrame, joining on the word ids.
+    Words without history get zero counters, dated today.
+    """
+    check_history_duplicates(df_history)
+    rows, history_rows = join_ids(df[COLUMN.WORD_ID].to_numpy(), df_history[COLUMN.WORD_ID].to_numpy())
+
+    today = np.datetime64(dt.date.today(), "ns")
+    for col in ["ok", "not_ok"]:
+        counts = np.zeros(df.shape[0], dtype=int)
+        counts[rows] = df_history[col].to_numpy()[history_rows]
+        df[col] = counts
+    for col in ["last_ok", "last_not_ok"]:
+        dates = np.full(df.shape[0], today)
+        dates[rows] = df_history[col].to_numpy(dtype="datetime64[ns]")[history_rows]
+        df[col] = dates
+
+    return df
+
+
+@timed("open_glossary.history")
 def load_history(df: pd.DataFrame, glossary_name: str) -> pd.DataFrame:
-    """Load history DataFrame and merge it with the vocabulary DataFrame."""
-    path_history = f"history/{glossary_name}.csv"
+    """Load history DataFrame and merge it with the vocabulary DataFrame.
+    The journal events not yet compacted are replayed on top of the history snapshot.
+    """
+    recover_journal(glossary_name)
+    df_history = fold_events(read_snapshot(glossary_name), read_journal_tail(glossary_name))
+    return merge_history(df, df_history)
 
-    if not os.path.exists(path_history):
-        init_empty_history(df)
-    else:
-        df_history = pd.read_csv(path_history)
-        check_history_duplicates(df_history)
 
-        df_history["last_ok"] = pd.to_datetime(df_history["last_ok"])
-        df_history["last_not_ok"] = pd.to_datetime(df_history["last_not_ok"])
+# * Functions
 
-        df = df.merge(df_history, how="left", on=COLUMN.ITALIAN)
-        del df_history
 
-        handle_ok_nulls(df)
+def prepare_glossary(
+    name: str,
+) -> tuple[
+    pd.DataFrame,
+    list["Section"],
+    dict["Section", list["Subsection"]],
+    list[list[int]],
+]:
+    """Load the glossary file and add its section and subsection ids."""
+    df = load_glossary_df(name)
 
-    return df
+    sections, subsections, sss_starts = create_sections_subsections(df)
+    df, sss_counts = add_ids_to_vocab_df(df, sss_starts)
 
+    return df, sections, subsections, sss_counts
 
-# * Functions
+
+def open_prepared_glossary(
+    name: str,
+    use_cache: bool = True,
+) -> tuple[
+    pd.DataFrame,
+    list["Section"],
+    dict["Section", list["Subsection"]],
+    list[list[int]],
+]:
+    """Prepare the glossary, or read it from the cache if the CSV has not changed."""
+    path = glossary_path(name)
+
+    with span("open_glossary.cache_read"):
+        prepared = read_cache(name, path) if use_cache else None
+    if prepared is None:
+        count("cache.miss")
+        prepared = prepare_glossary(name)
+        if use_cache:
+            with span("open_glossary.cache_write"):
+                write_cache(name, path, *prepared)
+    else:
+        count("cache.hit")
+
+    return prepared
 
 
+@timed("open_glossary")
 def open_glossary(
     name: str,
+    use_cache: bool = True,
 ) -> tuple[
     pd.DataFrame,
     list["Section"],
@@ -127,15 +200,82 @@ def open_glossary(
     list[list[int]],
 ]:
     """Open glossary file and convert it into pythonic classes.
-    CSV should have the columns: italiano, traduzione, sezione, sottosezione.
+    CSV should have the columns: italiano, one per language (spagnolo, inglese), sezione, sottosezione.
+    The prepared glossary is cached until the CSV changes.
     """
-    assert NAME_PATT.match(name)
-    df = load_glossary_df(name)
+    df, sections, subsections, sss_counts = open_prepared_glossary(name, use_cache)
+    df = load_history(df, glossary_name=name)
+    return df, sections, subsections, sss_counts
 
-    sections, subsections, aux_dfs = create_sections_subsections(df)
-    orig_ixs, start_ixs, next_start_ixs = get_ixs(aux_dfs)
-    df, sss_counts = add_ids_to_vocab_df(df, orig_ixs, start_ixs, next_start_ixs, subsections)
 
-    df = load_history(df, glossary_name=name)
+def merge_glossaries(
+    names: list[str],
+    glossaries: list[
+        tuple[
+            pd.DataFrame,
+            list["Section"],
+            dict["Section", list["Subsection"]],
+            list[list[int]],
+        ]
+    ],
+) -> tuple[
+    pd.DataFrame,
+    list["Section"],
+    dict["Section", list["Subsection"]],
+    list[list[int]],
+]:
+    """Merge several opened glossaries into one, in the given order.
+    Sections are renamed as `<section> (<name>)` and their ids are offset so that
+    they stay unique, and the `glossario_id` column tells each row's glossary.
+    """
+    dfs = []
+    sections, subsections, sss_counts = [], {}, []
+    for g_id, (name, (df, g_sections, g_subsections, g_sss_counts)) in enumerate(zip(names, glossaries)):
+        df["sezione_id"] += len(sections)
+        df["glossario_id"] = g_id
+        dfs.append(df)
 
-    return df, sections, subsections, sss_counts
+        for s in g_sections:
+            sections.append(f"{s} ({name})")
+            subsections[sections[-1]] = g_subsections[s]
+        sss_counts += g_sss_counts
+
+    return pd.concat(dfs, ignore_index=True), sections, subsections, sss_counts
+
+
+def open_glossaries(
+    names: list[str],
+    use_cache: bool = True,
+) -> tuple[
+    pd.DataFrame,
+    list["Section"],
+    dict["Section", list["Subsection"]],
+    list[list[int]],
+]:
+    """Open several glossaries in parallel, one per process, and merge them into one."""
+    assert len(set(names)) == len(names), "Duplicated glossary names."
+    if len(names) == 1:
+        return open_glossary(names[0], use_cache)
+
+    max_workers = min(len(names), os.cpu_count() or 1)
+    if max_workers == 1:
+        glossaries = [open_glossary(name, use_cache) for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            glossaries = list(pool.map(open_glossary, names, repeat(use_cache)))
+    return merge_glossaries(names, glossaries)
+
+
+def open_prepared_glossaries(
+    names: list[str],
+) -> tuple[
+    pd.DataFrame,
+    list["Section"],
+    dict["Section", list["Subsection"]],
+    list[list[int]],
+]:
+    """Prepare several glossaries, from their caches if unchanged, and merge them into
+    one, without their histories.
+    """
+    glossaries = [open_prepared_glossary(name) for name in names]
+    return glossaries[0] if len(names) == 1 else merge_glossaries(names, glossaries)
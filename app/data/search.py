@@ -0,0 +1,125 @@
+"""Instant search of the deck's words.
+
+Words are folded (lowercase, without accents) and split into tokens. Each column
+gets an inverted index from its tokens to the rows containing them, kept as flat
+arrays: tokens are sorted, so the tokens sharing a prefix are a contiguous range
+found with two binary searches, as in a prefix trie, and the postings of that
+range are a contiguous slice. A query costs a few binary searches and slices,
+whatever the size of the glossary.
+"""
+
+import re
+import unicodedata
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from metrics import span, timed
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+# After folding, non-ASCII bytes are letters of other alphabets
+TOKEN_PATT = re.compile(rb"[\w\x80-\xff]+")
+ROW_TOKEN_PATT = re.compile(rb"[\w\x80-\xff]+|\n")
+MAX_RESULTS = 50
+MAX_TOKEN_LEN = 24  # Longer tokens are indexed and searched by their first bytes
+PREFIX_END = b"\xff"  # Never found in UTF-8, so it sorts after any token sharing a prefix
+
+
+def fold_table() -> dict[int, str]:
+    """Translation table from the accented Latin letters to their base letter,
+    and from the Latin-1 punctuation and typographic quotes to spaces.
+    """
+    table = {}
+    for char in map(chr, [*range(0x80, 0x250), *range(0x2018, 0x2020)]):
+        base = unicodedata.normalize("NFKD", char)[0]
+        if not char.isalnum():
+            table[ord(char)] = " "
+        elif base != char and base.isascii():
+            table[ord(char)] = base
+    return table
+
+
+FOLD_TABLE = fold_table()
+
+
+def fold(text: str) -> bytes:
+    """Lowercase text without accents, encoded as UTF-8, whose byte order is the code point order."""
+    text = text.lower()
+    return (text if text.isascii() else text.translate(FOLD_TABLE)).encode()
+
+
+def tokenize(query: str) -> list[bytes]:
+    return [token[:MAX_TOKEN_LEN] for token in TOKEN_PATT.findall(fold(query))]
+
+
+class TokenIndex:
+    """Inverted index of a text column.
+    The rows of token `tokens[i]` are `postings[starts[i]:starts[i + 1]]`, in order.
+    """
+    def __init__(self, words: Iterable):
+        # The whole column is folded and tokenized at once, with a newline ending each row
+        text = "\n".join(word.replace("\n", " ") if isinstance(word, str) else "" for word in words) + "\n"
+        matches = np.array(ROW_TOKEN_PATT.findall(fold(text)), dtype=f"S{MAX_TOKEN_LEN}")
+        is_row_end = matches == b"\n"
+        rows = np.cumsum(is_row_end, dtype=np.int32)[~is_row_end]
+
+        tokens, codes = np.unique(matches[~is_row_end], return_inverse=True)
+        order = np.argsort(codes, kind="stable")
+        codes, rows = codes[order], rows[order]
+        # A row repeating a token would be posted twice in a row
+        is_new = np.r_[True, (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])]
+
+        self.n_rows = int(is_row_end.sum())
+        self.tokens = tokens
+        self.postings = rows[is_new]
+        self.starts = np.searchsorted(codes[is_new], np.arange(tokens.size + 1))
+
+    def rows(self, token: bytes, is_prefix: bool) -> "ndarray":
+        """Rows containing `token`, or any token starting with it if `is_prefix`."""
+        lo = np.searchsorted(self.tokens, token, side="left")
+        hi = np.searchsorted(self.tokens, token + PREFIX_END if is_prefix else token, side="right")
+        return self.postings[self.starts[lo]:self.starts[hi]]
+
+    def search(self, tokens: list[bytes]) -> "ndarray":
+        """Rows containing all the tokens, the last of which may be incomplete.
+        Rows are ordered by their matching token of the last kind, then by position.
+        """
+        *complete, last = tokens
+        matches = self.rows(last, is_prefix=True)
+        for token in complete:
+            if matches.size == 0:
+                break
+            # Rows of the complete word are few, so they mask the prefix's rows
+            is_match = np.zeros(self.n_rows, dtype=bool)
+            is_match[self.rows(token, is_prefix=False)] = True
+            matches = matches[is_match[matches]]
+        return pd.unique(matches)
+
+    def memory_usage(self) -> int:
+        return self.tokens.nbytes + self.postings.nbytes + self.starts.nbytes
+
+
+class SearchIndex:
+    """Token indexes of the Italian words and of their translations."""
+    def __init__(self, italiano: Iterable, traduzione: Iterable):
+        with span("search.build"):
+            self.italiano = TokenIndex(italiano)
+            self.traduzione = TokenIndex(traduzione)
+
+    @timed("search.query")
+    def search(self, query: str, limit: int = MAX_RESULTS) -> "ndarray":
+        """Rows matching a query as it is typed: Italian matches first, then translations."""
+        tokens = tokenize(query)
+        if not tokens:
+            return np.empty(0, dtype=np.int32)
+
+        rows = self.italiano.search(tokens)[:limit]
+        if rows.size < limit:
+            more = self.traduzione.search(tokens)
+            more = more[~np.isin(more, rows)][:limit - rows.size]
+            rows = np.concatenate([rows, more])
+        return rows
@@ -0,0 +1,318 @@
+"""SQLite storage of a glossary and its history.
+
+The database lives in `history/<name>.db` and is opened in WAL mode. The glossary
+CSV is imported whenever it changes, upserting its words on their ids: the words
+removed from the CSV keep their counters, in case they are added back, and the
+history CSV remains available as an export format.
+"""
+
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from data.cache import cache_key
+from data.journal import (
+    clear_journal,
+    fold_events,
+    read_journal_tail,
+    read_snapshot,
+    recover_journal,
+)
+from data.loading import glossary_path, merge_history, open_prepared_glossary
+from data.saving import save_history, vocab_to_history
+from data.utils import word_ids
+from options import COLUMN
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+    from pandas import DataFrame
+
+    from classes import Section, Subsection
+
+# `row_id` is the position of a word in the glossary, NULL once removed from it
+WORDS_TABLE = """
+CREATE TABLE IF NOT EXISTS words (
+    parola_id       INTEGER PRIMARY KEY,
+    row_id          INTEGER UNIQUE,
+    italiano        TEXT NOT NULL,
+    CEFR            TEXT,
+    spagnolo        TEXT,
+    inglese         TEXT,
+    sezione_id      INTEGER NOT NULL,
+    sottosezione_id INTEGER NOT NULL,
+    ok              INTEGER NOT NULL DEFAULT 0,
+    not_ok          INTEGER NOT NULL DEFAULT 0,
+    last_ok         TEXT,
+    last_not_ok     TEXT
+)"""
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subsections (
+    sezione_id INTEGER NOT NULL,
+    id         INTEGER NOT NULL,
+    name       TEXT NOT NULL,
+    PRIMARY KEY (sezione_id, id)
+);
+{WORDS_TABLE};
+"""
+# Created once the words table of older databases is rebuilt
+INDEXES = """
+CREATE INDEX IF NOT EXISTS words_sss ON words (sezione_id, sottosezione_id);
+"""
+
+# Columns needed by the review loop
+REVIEW_COLS = [
+    COLUMN.WORD_ID, COLUMN.ITALIAN, *COLUMN.LANGUAGES, "sezione_id", "sottosezione_id",
+    "ok", "not_ok", "last_ok", "last_not_ok",
+]
+WORD_COLS = REVIEW_COLS[:2] + [COLUMN.CEFR] + REVIEW_COLS[2:]
+# Columns set by an import; the counters of the words already stored are kept
+GLOSSARY_COLS = ["row_id", *WORD_COLS[:-4]]
+
+
+def db_path(glossary_name: str) -> str:
+    return f"history/{glossary_name}.db"
+
+
+class SQLiteStore:
+    """SQLite storage backend, with one-row updates for each grade."""
+    def __init__(self, glossary_name: str):
+        self.glossary_name = glossary_name
+        os.makedirs("history", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path(glossary_name), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._add_word_ids()
+        self._add_languages()
+        self._rebuild_words()
+        self.conn.executescript(INDEXES)
+
+    def _add_word_ids(self) -> None:
+        """Add the word id column to a database from before word ids. The glossary is
+        imported again to set the ids, keeping the counters of the words.
+        """
+        columns = [name for _, name, *_ in self.conn.execute("PRAGMA table_info(words)")]
+        if COLUMN.WORD_ID not in columns:
+            with self.conn:
+                self.conn.execute(f"ALTER TABLE words ADD COLUMN {COLUMN.WORD_ID} INTEGER")
+                self.conn.execute("DELETE FROM meta WHERE key = 'glossary_key'")
+
+    def _add_languages(self) -> None:
+        """Add the language columns missing from the database, such as those of a database
+        from before the translations were kept per language. The glossary is imported
+        again to fill them, keeping the counters of the words.
+        """
+        columns = [name for _, name, *_ in self.conn.execute("PRAGMA table_info(words)")]
+        missing = [lang for lang in COLUMN.LANGUAGES if lang not in columns]
+        if missing:
+            with self.conn:
+                for lang in missing:
+                    self.conn.execute(f"ALTER TABLE words ADD COLUMN {lang} TEXT")
+                self.conn.execute("DELETE FROM meta WHERE key = 'glossary_key'")
+
+    def _rebuild_words(self) -> None:
+        """Rebuild the words table of a database from before the words were keyed on
+        their ids, when they were keyed on their position. Words without an id get
+        theirs first.
+        """
+        primary_keys = [name for _, name, *_, pk in self.conn.execute("PRAGMA table_info(words)") if pk]
+        if primary_keys == [COLUMN.WORD_ID]:
+            return
+
+        df = pd.read_sql_query(
+            "SELECT row_id, italiano FROM words WHERE parola_id IS NULL",
+            self.conn,
+        )
+        df[COLUMN.WORD_ID] = word_ids(df[COLUMN.ITALIAN])
+        columns = ", ".join(name for _, name, *_ in self.conn.execute("PRAGMA table_info(words)"))
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "UPDATE words SET parola_id = ? WHERE row_id = ?",
+                zip(df[COLUMN.WORD_ID].tolist(), df["row_id"].tolist()),
+            )
+            self.conn.execute("ALTER TABLE words RENAME TO words_old")
+            self.conn.execute(WORDS_TABLE)
+            # Like the glossary, only the first row of a duplicated word is kept
+            self.conn.execute(f"INSERT OR IGNORE INTO words ({columns}) SELECT {columns} FROM words_old ORDER BY row_id")
+            self.conn.execute("DROP TABLE words_old")
+
+    def _get_meta(self, key: str) -> str | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _load_history(self) -> "DataFrame":
+        """Load the reviewed words' counters, or the CSV history if the database is new."""
+        if self.conn.execute("SELECT 1 FROM words LIMIT 1").fetchone() is None:
+            recover_journal(self.glossary_name)
+            return fold_events(read_snapshot(self.glossary_name), read_journal_tail(self.glossary_name))
+
+        # Including the words removed from the glossary
+        df_history = pd.read_sql_query(
+            "SELECT parola_id, italiano, ok, not_ok, last_ok, last_not_ok FROM words WHERE ok + not_ok > 0",
+            self.conn,
+        )
+        df_history["last_ok"] = pd.to_datetime(df_history["last_ok"])
+        df_history["last_not_ok"] = pd.to_datetime(df_history["last_not_ok"])
+        return df_history
+
+    def import_glossary(self) -> None:
+        """Import the glossary CSV, keeping the counters of the words already reviewed.
+        The words are staged in their own table, then upserted on their ids.
+        """
+        df, sections, subsections, _ = open_prepared_glossary(self.glossary_name)
+        # Only new words take these counters, which a new database gets from the CSV history
+        df = merge_history(df, self._load_history())
+        for col in ["last_ok", "last_not_ok"]:
+            df[col] = df[col].dt.strftime("%Y-%m-%d")
+
+        with self._lock:
+            df[WORD_COLS].to_sql("words_import", self.conn, if_exists="replace", index_label="row_id")
+        columns = ", ".join(["row_id", *WORD_COLS])
+        updates = ", ".join(f"{col} = excluded.{col}" for col in GLOSSARY_COLS if col != COLUMN.WORD_ID)
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE words SET row_id = NULL")
+            self.conn.execute(
+                f"""
+                INSERT INTO words ({columns})
+                SELECT {columns} FROM words_import WHERE true
+                ON CONFLICT (parola_id) DO UPDATE SET {updates}
+                """
+            )
+            self.conn.execute("DROP TABLE words_import")
+            self.conn.execute("DELETE FROM subsections")
+            self.conn.execute("DELETE FROM sections")
+            # Missing names are stored as empty text
+            self.conn.executemany(
+                "INSERT INTO sections (id, name) VALUES (?, ?)",
+                [(s_id, s if isinstance(s, str) else "") for s_id, s in enumerate(sections)],
+            )
+            self.conn.executemany(
+                "INSERT INTO subsections (sezione_id, id, name) VALUES (?, ?, ?)",
+                [
+                    (s_id, ss_id, ss if isinstance(ss, str) else "")
+                    for s_id, s in enumerate(sections)
+                    for ss_id, ss in enumerate(subsections[s])
+                ],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('glossary_key', ?)",
+                (json.dumps(cache_key(glossary_path(self.glossary_name))),),
+            )
+        print("Glossary imported into the database.")
+
+    def load_sections(
+        self,
+    ) -> tuple[
+        list["Section"],
+        dict["Section", list["Subsection"]],
+        list[list[int]],
+    ]:
+        """Load sections, subsections and their word counts.
+        Missing names are NaN, as when the glossary is read from its CSV.
+        """
+        sections = [name or np.nan for (name,) in self.conn.execute("SELECT name FROM sections ORDER BY id")]
+        subsections = {s: [] for s in sections}
+        sss_counts = [[] for _ in sections]
+
+        rows = self.conn.execute(
+            """
+            SELECT ss.sezione_id, ss.name, COUNT(w.row_id)
+            FROM subsections AS ss
+            LEFT JOIN words AS w
+                ON w.sezione_id = ss.sezione_id AND w.sottosezione_id = ss.id AND w.row_id IS NOT NULL
+            GROUP BY ss.sezione_id, ss.id
+            ORDER BY ss.sezione_id, ss.id
+            """
+        )
+        for s_id, ss, count in rows:
+            subsections[sections[s_id]].append(ss or np.nan)
+            sss_counts[s_id].append(count)
+
+        return sections, subsections, sss_counts
+
+    def load_vocab(self) -> "DataFrame":
+        """Load the vocabulary DataFrame, only with the columns needed for reviewing."""
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(REVIEW_COLS)} FROM words WHERE row_id IS NOT NULL ORDER BY row_id",
+            self.conn,
+        )
+        df["last_ok"] = pd.to_datetime(df["last_ok"])
+        df["last_not_ok"] = pd.to_datetime(df["last_not_ok"])
+        return df
+
+    def open_glossary(
+        self,
+    ) -> tuple[
+        pd.DataFrame,
+        list["Section"],
+        dict["Section", list["Subsection"]],
+        list[list[int]],
+    ]:
+        """Open the glossary from the database, importing the CSV first if it changed."""
+        stored_key = self._get_meta("glossary_key")
+        if stored_key is None or json.loads(stored_key) != cache_key(glossary_path(self.glossary_name)):
+            self.import_glossary()
+        return self.load_vocab(), *self.load_sections()
+
+    def count_sections(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+
+    def section_word_ids(self, sss: list[tuple[int, int]]) -> "ndarray":
+        """Ids of the glossary's words in the given (section, subsection) pairs, looked up
+        through the index on the pairs.
+        """
+        if not sss:
+            return np.empty(0, dtype=np.int64)
+        with self._lock:
+            rows = self.conn.execute(
+                f"""
+                WITH sss (s_id, ss_id) AS (VALUES {", ".join(len(sss) * ["(?, ?)"])})
+                SELECT parola_id FROM sss
+                JOIN words ON sezione_id = s_id AND sottosezione_id = ss_id
+                WHERE row_id IS NOT NULL
+                """,
+                [v for pair in sss for v in pair],
+            ).fetchall()
+        return np.array([word_id for (word_id,) in rows], dtype=np.int64)
+
+    def record(self, word: str, word_id: int, is_error: bool, timestamp: dt.datetime) -> None:
+        """Apply a grade to the word's counters."""
+        status = "not_ok" if is_error else "ok"
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"UPDATE words SET {status} = {status} + 1, last_{status} = ? WHERE parola_id = ?",
+                (timestamp.date().isoformat(), word_id),
+            )
+
+    def flush(self) -> None:
+        """Grades are committed as they are recorded, so there is nothing to sync."""
+
+    def export_history(self) -> None:
+        """Export the history to its CSV file.
+        The CSV journal was already imported into the database, so it is cleared.
+        """
+        df_history = self._load_history()
+        save_history(vocab_to_history(df_history), self.glossary_name)
+        clear_journal(self.glossary_name)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
@@ -1,136 +1,145 @@
 """Module for data utility functions."""
 
-import datetime as dt
-from math import isnan
 from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
 
 from options import COLUMN
 
 if TYPE_CHECKING:
+    from numpy import ndarray
     from pandas import DataFrame
 
-    from classes import Section, Subsection
-
 # load_glossary_df
 
-
-def check_na(val) -> bool:
-    return isinstance(val, float) and isnan(val)
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+ID_CHUNK_SIZE = 50_000
+
+
+def word_ids(words: pd.Series) -> "ndarray":
+    """Stable 64-bit ids of words: FNV-1a hashes of the code points of their exact
+    spelling, so words differing only in case get different ids. Ids only depend on
+    the words, so they are the same on every run and platform.
+    """
+    forms = words.astype(str).to_numpy(dtype=str)
+    ids = np.empty(forms.size, dtype=np.uint64)
+    for start in range(0, forms.size, ID_CHUNK_SIZE):
+        chunk = forms[start:start + ID_CHUNK_SIZE]
+        width = max(chunk.dtype.itemsize // 4, 1)
+        codes = chunk.astype(f"<U{width}").view("<u4").reshape(-1, width).astype(np.uint64)
+
+        hashes = np.full(chunk.size, FNV_OFFSET)
+        for col in codes.T:
+            # Shorter words are padded with zeros, which leave their hash as is
+            hashes = np.where(col != 0, (hashes ^ col) * FNV_PRIME, hashes)
+        ids[start:start + chunk.size] = hashes
+    return ids.view(np.int64)
+
+
+def add_word_ids(df: "DataFrame") -> None:
+    """Set the ids of the words which do not have one yet, from their spelling.
+    These ids are not written back to the glossary, so correcting the spelling of
+    such a word starts its history again; a word keeps its history across edits only
+    if the glossary gives its id.
+    """
+    if COLUMN.WORD_ID not in df:
+        df[COLUMN.WORD_ID] = word_ids(df[COLUMN.ITALIAN])
+        return
+
+    missing = df[COLUMN.WORD_ID].isna().to_numpy()
+    ids = df[COLUMN.WORD_ID].to_numpy(dtype=np.int64, na_value=0)
+    ids[missing] = word_ids(df.loc[missing, COLUMN.ITALIAN])
+    df[COLUMN.WORD_ID] = ids
 
 
 def check_glossary_duplicates(df: "DataFrame") -> bool:
+    """Drop the rows whose id is already taken. Rows only share an id when it comes
+    from the glossary, or on a hash collision, so those with a different spelling
+    are reported.
+    """
+    is_dupl = df.duplicated(COLUMN.WORD_ID, keep="first")
+    df_first = df.drop_duplicates(COLUMN.WORD_ID, keep="first").set_index(COLUMN.WORD_ID)
+    df_dupl = df.loc[is_dupl, [COLUMN.WORD_ID, COLUMN.ITALIAN]]
+    first_words = df_first.loc[df_dupl[COLUMN.WORD_ID], COLUMN.ITALIAN].to_numpy()
+    collisions = df_dupl[df_dupl[COLUMN.ITALIAN].to_numpy() != first_words]
+    if not collisions.empty:
+        print("DIFFERENT WORDS WITH THE SAME ID, ONLY THE FIRST IS KEPT:")
+        print(collisions.to_string(index=False))
+
     prev_len = df.shape[0]
-    df.drop_duplicates(COLUMN.ITALIAN, keep="first", ignore_index=True, inplace=True)
+    df.drop_duplicates(COLUMN.WORD_ID, keep="first", ignore_index=True, inplace=True)
     duplicated_rows = prev_len - df.shape[0]
     print(f"DELETED {duplicated_rows} DUPLICATED ROWS")
     return duplicated_rows > 0
 
 
-def concat_langs(row: pd.Series) -> str:
-    """Concatenate the two languages correspondingly."""
-    if check_na(row[COLUMN.SPANISH]):
-        return row[COLUMN.ENGLISH]
-    elif check_na(row[COLUMN.ENGLISH]):
-        return row[COLUMN.SPANISH]
-    else:
-        return f"{row[COLUMN.SPANISH]}, {row[COLUMN.ENGLISH]}"
-
-
 # create_sections_subsections
 
 
-def process_sections_subsections(df: "DataFrame") -> tuple["DataFrame", int]:
-    # Index: Start of tuple (s, ss) in glossary df
-    df_sss = df[["sezione", "sottosezione"]].drop_duplicates(keep="first")
-    return df_sss, df_sss.shape[0]
-
+def get_sss_starts(df: "DataFrame") -> tuple["ndarray", "ndarray"]:
+    """Get the row indices where each section and each (section, subsection) start.
+    NOTE: df must already be alphabetically ordered.
+    """
+    # Missing names are NaN, which is not equal to itself
+    s_col = df[COLUMN.SECTION].fillna("").to_numpy()
+    ss_col = df[COLUMN.SUBSECTION].fillna("").to_numpy()
 
-def process_sections(
-    df_sss: "DataFrame"
-) -> tuple[list["Section"], list[int], list[int]]:
-    # Index: Start of s in df_sss
-    ser_s = df_sss["sezione"].reset_index(drop=True).drop_duplicates(keep="first")
+    new_s = np.ones(df.shape[0], dtype=bool)
+    new_s[1:] = s_col[1:] != s_col[:-1]
+    new_ss = new_s.copy()
+    new_ss[1:] |= ss_col[1:] != ss_col[:-1]
 
-    sections = ser_s.to_list()
-    ixs = ser_s.index.to_list()
-    ixs_next = ixs[1:] + [-1]
-
-    return sections, ixs, ixs_next
+    return np.flatnonzero(new_s), np.flatnonzero(new_ss)
 
 
 # add_ids_to_vocab_df
 
 
 def init_vocab_df(df_: "DataFrame") -> "DataFrame":
-    df = df_.drop(["sezione", "sottosezione"], axis=1)
-    df.loc[:, "sezione_id"] = -1
-    df.loc[:, "sottosezione_id"] = -1
-    return df
-
-
-def init_sss_counts(
-    df: "DataFrame",
-    subsections: dict["Section", list["Subsection"]],
-) -> tuple[list[list[int]], int, int]:
-    sss_counts = [
-        len(ss_list) * [0]
-        for ss_list in subsections.values()
-    ]
-    sid_col_iat = df.columns.get_loc("sezione_id")
-    ssid_col_iat = df.columns.get_loc("sottosezione_id")
-    return sss_counts, sid_col_iat, ssid_col_iat
-
-
-def loop_add_ids(
-    df: "DataFrame",
-    zip_loop,
-    sid_col_iat: int,
-    ssid_col_iat: int,
-    sss_counts: list[list[int]],
-) -> None:
-    """We modify the original DataFrame with the information we now know."""
-    for s_id, (ss_ixs, start_ix, next_start_ix) in zip_loop:
-        end_ix = df.shape[0] if next_start_ix == -1 else next_start_ix
-        df.iloc[start_ix:end_ix, sid_col_iat] = s_id
-
-        next_ss_ixs = ss_ixs[1:] + [-1]
-        for ss_id, (ss_ix, next_ss_ix) in enumerate(zip(ss_ixs, next_ss_ixs)):
-            ss_end_ix = end_ix if next_ss_ix == -1 else next_ss_ix
-            df.iloc[ss_ix:ss_end_ix, ssid_col_iat] = ss_id
-            sss_counts[s_id][ss_id] = ss_end_ix - ss_ix
-
-    assert not (df["sezione_id"] == -1).any()
-    assert not (df["sottosezione_id"] == -1).any()
+    return df_.drop([COLUMN.SECTION, COLUMN.SUBSECTION], axis=1)
 
 
-# load_history
+def get_sss_ids(
+    n_rows: int,
+    s_starts: "ndarray",
+    ss_starts: "ndarray",
+) -> tuple["ndarray", "ndarray", list[list[int]]]:
+    """Get the section id and subsection id of each row, and the subsection counts.
+    Subsection ids restart from 0 in each section.
+    """
+    s_ids = np.repeat(np.arange(s_starts.size), np.diff(s_starts, append=n_rows))
+    ss_lens = np.diff(ss_starts, append=n_rows)
+
+    # Position of the first subsection of each section among all subsections
+    first_ss = np.searchsorted(ss_starts, s_starts)
+    ss_ids_per_ss = np.arange(ss_starts.size) - first_ss[s_ids[ss_starts]]
+    ss_ids = np.repeat(ss_ids_per_ss, ss_lens)
 
+    sss_counts = [counts.tolist() for counts in np.split(ss_lens, first_ss[1:])]
+    return s_ids, ss_ids, sss_counts
 
-def init_empty_history(df: "DataFrame") -> None:
-    today = dt.date.today()
-    df.loc[:, "ok"] = 0
-    df.loc[:, "not_ok"] = 0
-    df.loc[:, "last_ok"] = pd.to_datetime(today)
-    df.loc[:, "last_not_ok"] = pd.to_datetime(today)
+
+# load_history
 
 
 def check_history_duplicates(df_history: "DataFrame") -> None:
-    dupl_words = df_history[COLUMN.ITALIAN].value_counts()
-    dupl_words = dupl_words[dupl_words > 1]
-    if not dupl_words.empty:
+    ids = np.sort(df_history[COLUMN.WORD_ID].to_numpy())
+    dupl_ids = ids[1:][ids[1:] == ids[:-1]]
+    if dupl_ids.size:
         print("DUPLICATED WORDS IN HISTORY:")
-        print(dupl_words)
+        print(df_history.loc[df_history[COLUMN.WORD_ID].isin(dupl_ids), COLUMN.ITALIAN].value_counts())
         raise AssertionError("Duplicated words in history.")
 
 
-def handle_ok_nulls(df: "DataFrame") -> None:
-    mask_null = df["ok"].isnull()
-    if mask_null.any():
-        df.loc[mask_null, "ok"] = 0
-        df.loc[mask_null, "not_ok"] = 0
-        df.astype({"ok": int, "not_ok": int}, copy=False)
-
-        df.loc[mask_null, "last_ok"] = pd.to_datetime(dt.date.today())
-        df.loc[mask_null, "last_not_ok"] = pd.to_datetime(dt.date.today())
+def join_ids(ids: "ndarray", other_ids: "ndarray") -> tuple["ndarray", "ndarray"]:
+    """Positions of the ids found in both arrays, such that `ids[left] == other_ids[right]`.
+    Ids must be unique in each array.
+    """
+    if ids.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    order = np.argsort(ids, kind="stable")
+    pos = np.minimum(np.searchsorted(ids, other_ids, sorter=order), ids.size - 1)
+    found = ids[order[pos]] == other_ids
+    return order[pos[found]], np.flatnonzero(found)
@@ -0,0 +1,66 @@
+"""Watcher of the glossary files, for hot reloads.
+
+The files are polled, as the standard library has no file notifications. A
+change is only reported once the file has not changed for a whole poll, so that
+a file being saved is not read half-written.
+"""
+
+import threading
+from collections.abc import Callable
+
+from data.cache import cache_key
+from data.loading import glossary_path
+
+POLL_INTERVAL = 1.0  # Seconds
+
+
+def file_key(path: str) -> dict | None:
+    """Key of a file's version, or None while it is missing, as when it is being replaced."""
+    try:
+        return cache_key(path)
+    except OSError:
+        return None
+
+
+class GlossaryWatcher:
+    """Calls `on_change` with the names of the glossaries whose CSV changed, from
+    a daemon thread. A change is reported once, even if it could not be handled.
+    """
+    def __init__(
+        self,
+        names: list[str],
+        on_change: Callable[[list[str]], None],
+        interval: float = POLL_INTERVAL,
+    ):
+        self.keys = {name: file_key(glossary_path(name)) for name in names}
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="glossary-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        pending: dict[str, dict] = {}
+        while not self._stop.wait(self.interval):
+            changed = []
+            for name, key in self.keys.items():
+                new_key = file_key(glossary_path(name))
+                if new_key is None or new_key == key:
+                    pending.pop(name, None)
+                elif pending.get(name) == new_key:
+                    changed.append(name)
+                else:
+                    pending[name] = new_key
+            if not changed:
+                continue
+
+            try:
+                self.on_change(changed)
+            except (OSError, ValueError, KeyError, AssertionError) as e:
+                print(f"Glossaries {changed} could not be reloaded: {e!r}")
+            for name in changed:
+                self.keys[name] = pending.pop(name)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
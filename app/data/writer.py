@@ -0,0 +1,83 @@
+"""Background writer of the review history.
+
+Grades are queued by the click handlers and written to the recorder (journal or
+SQLite store) of their glossary by a single thread, so disk writes never block a review.
+When no grade comes for `flush_interval` seconds, the thread flushes the recorders.
+"""
+
+import datetime as dt
+import queue
+import sqlite3
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from data.journal import ReviewJournal
+    from data.sqlite_store import SQLiteStore
+
+
+class BackgroundWriter:
+    """Queue of grades, written in order by a single daemon thread.
+    `recorders` holds the recorder of each glossary, indexed by glossary id.
+    """
+    def __init__(
+        self,
+        recorders: list["ReviewJournal | SQLiteStore"],
+        flush_interval: float = 5.0,
+    ):
+        self.recorders = recorders
+        self.flush_interval = flush_interval
+        self._queue: queue.SimpleQueue[
+            tuple[str, int, bool, dt.datetime, int] | Callable[[], None] | None
+        ] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def _flush(self) -> None:
+        for recorder in self.recorders:
+            try:
+                recorder.flush()
+            except (OSError, sqlite3.Error) as e:
+                print(f"History could not be synced: {e}")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                event = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush()
+                continue
+            if event is None:
+                break
+            if callable(event):
+                try:
+                    event()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"History could not be updated: {e}")
+                continue
+            word, word_id, is_error, timestamp, glossary_id = event
+            try:
+                self.recorders[glossary_id].record(word, word_id, is_error, timestamp)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Grade of '{word}' could not be saved: {e}")
+
+    def record(
+        self,
+        word: str,
+        word_id: int,
+        is_error: bool,
+        timestamp: dt.datetime,
+        glossary_id: int = 0,
+    ) -> None:
+        """Queue a grade, without waiting for it to be written."""
+        self._queue.put((word, word_id, is_error, timestamp, glossary_id))
+
+    def call(self, fn: Callable[[], None]) -> None:
+        """Queue a call to run on the writer's thread, once the grades queued before it are written."""
+        self._queue.put(fn)
+
+    def close(self) -> None:
+        """Write the queued grades and stop the thread. The recorders are left open."""
+        self._queue.put(None)
+        self._thread.join()
@@ -5,21 +5,26 @@ from typing import TYPE_CHECKING
 
 import numpy as np
 
+from metrics import timed
+
 if TYPE_CHECKING:
     from numpy import ndarray
     from pandas import DataFrame
 
 
+@timed("ordering.random")
 def random_ordering(df_vocab: "DataFrame") -> "ndarray":
     """Flashcard ordering based on pure randomness."""
     return df_vocab.index.to_series().sample(frac=1).values.copy()
 
 
+@timed("ordering.alphabetic")
 def alphabetic_ordering(df_vocab: "DataFrame") -> "ndarray":
     """Flashcard ordering based on alphabetic ordering."""
     return df_vocab.index.values.copy()
 
 
+@timed("ordering.net_errors")
 def net_errors_ordering(df_vocab: "DataFrame") -> "ndarray":
     """Flashcard ordering based on net errors."""
     df = df_vocab[["ok", "not_ok"]].copy()
@@ -33,6 +38,7 @@ def make_net_weighted_errors_ordering(randomness_sigma: float):
     """Make net_weighted_errors_ordering function."""
     assert 0.0 < randomness_sigma < 5.0
 
+    @timed("ordering.net_errors_weighted")
     def net_weighted_errors_ordering(df_vocab: "DataFrame") -> "ndarray":
         """Flashcard ordering based on weighted net errors and randomness."""
         df = df_vocab[["ok", "not_ok"]].copy()
@@ -48,3 +54,45 @@ def make_net_weighted_errors_ordering(randomness_sigma: float):
         return df.index.values.copy()
 
     return net_weighted_errors_ordering
+
+
+# * Spaced repetition
+
+SR_INIT_EASE = 2.5
+SR_MIN_EASE = 1.3
+SR_MAX_EASE = 3.0
+SR_EASE_BONUS = 0.1
+SR_EASE_PENALTY = 0.2
+SR_MAX_STREAK = 10
+SR_MAX_STABILITY = SR_MAX_EASE ** SR_MAX_STREAK  # Days, as estimated from the longest streak
+
+
+@timed("ordering.spaced_repetition")
+def spaced_repetition_memory(
+    df_vocab: "DataFrame",
+    today: "np.datetime64",
+) -> tuple["ndarray", "ndarray", "ndarray"]:
+    """SM-2 style ease, stability (interval in days) and due date of each card.
+    They are estimated from the history, as only counters and last dates are stored.
+    """
+    ok = df_vocab["ok"].to_numpy(dtype=int)
+    not_ok = df_vocab["not_ok"].to_numpy(dtype=int)
+    last_ok = df_vocab["last_ok"].to_numpy(dtype="datetime64[D]")
+    last_not_ok = df_vocab["last_not_ok"].to_numpy(dtype="datetime64[D]")
+
+    ease = np.clip(
+        SR_INIT_EASE + SR_EASE_BONUS * ok - SR_EASE_PENALTY * not_ok,
+        SR_MIN_EASE,
+        SR_MAX_EASE,
+    )
+
+    # Dates of outcomes that never happened are placeholders
+    last_was_error = (not_ok > 0) & ((ok == 0) | (last_not_ok >= last_ok))
+    streak = np.clip(ok - not_ok, 0, SR_MAX_STREAK)
+    stability = np.where(last_was_error, 1.0, np.maximum(ease ** streak, 1.0))
+
+    last_review = np.where(last_was_error, last_not_ok, last_ok)
+    due = last_review + np.round(stability).astype("timedelta64[D]")
+    due[ok + not_ok == 0] = today  # New cards
+
+    return ease, stability, due
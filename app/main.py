@@ -1,28 +1,324 @@
-"""Main script."""
+"""Main script.
 
-# TODO: argparse
+Heavy modules are imported lazily, so that the terminal review never loads Gradio.
+"""
 
+import argparse
+import time
+from typing import TYPE_CHECKING
+
+import metrics
 from data.ascii import print_ascii_intro
-from data.saving import save_history, vocab_to_history
-from options import ORDERING
-from ui import create_ui
+from options import COLUMN, FORMAT, ORDERING, STORAGE
+
+if TYPE_CHECKING:
+    from components.deck import Deck
+    from data.journal import ReviewJournal
+    from data.sqlite_store import SQLiteStore
+    from data.watcher import GlossaryWatcher
+    from data.writer import BackgroundWriter
+
+START = time.perf_counter()
+
+UI = "ui"
+REVIEW = "review"
+DEDUP = "dedup"
+IMPORT = "import"
+API = "api"
+
+
+def open_storage(
+    glossary_names: list[str],
+    storage: str,
+) -> tuple[list["ReviewJournal | SQLiteStore"], tuple]:
+    """Open the glossaries, merged into one, and the recorders of their histories."""
+    assert storage in STORAGE.ALL, f"Storage not recognized: '{storage}'"
+
+    if storage == STORAGE.SQLITE:
+        from data.loading import merge_glossaries
+        from data.sqlite_store import SQLiteStore
+        recorders = [SQLiteStore(name) for name in glossary_names]
+        glossaries = [recorder.open_glossary() for recorder in recorders]
+        glossary = glossaries[0] if len(glossaries) == 1 else merge_glossaries(glossary_names, glossaries)
+    else:
+        from data.journal import ReviewJournal
+        from data.loading import open_glossaries
+        recorders = [ReviewJournal(name) for name in glossary_names]
+        glossary = open_glossaries(glossary_names)
+        for recorder in recorders:
+            recorder.compact_in_background()
+
+    return recorders, glossary
+
+
+def section_word_ids(recorders: list["SQLiteStore"]):
+    """Look up the words of (section, subsection) pairs in the glossaries' databases.
+    The sections of each glossary follow those of the glossaries before it in the deck.
+    """
+    import numpy as np
+
+    def word_ids_fn(sss: list[tuple[int, int]]) -> np.ndarray:
+        word_ids = [np.empty(0, dtype=np.int64)]
+        offset = 0
+        for recorder in recorders:
+            n_sections = recorder.count_sections()
+            local_sss = [(s_id - offset, ss_id) for s_id, ss_id in sss if offset <= s_id < offset + n_sections]
+            word_ids.append(recorder.section_word_ids(local_sss))
+            offset += n_sections
+        return np.concatenate(word_ids)
+
+    return word_ids_fn
+
+
+def close_storage(
+    glossary_names: list[str],
+    storage: str,
+    recorders: list["ReviewJournal | SQLiteStore"],
+) -> None:
+    """Save the histories and close the recorders."""
+    for name, recorder in zip(glossary_names, recorders):
+        if storage == STORAGE.SQLITE:
+            recorder.export_history()
+            recorder.close()
+        else:
+            from data.journal import compact_journal
+            recorder.close()
+            compact_journal(name)
 
-with open("app/styles.css") as f:
-    CSS = f.read()
 
+def watch_glossaries(
+    deck: "Deck",
+    glossary_names: list[str],
+    storage: str,
+    recorders: list["ReviewJournal | SQLiteStore"],
+    writer: "BackgroundWriter",
+) -> "GlossaryWatcher":
+    """Reload the deck whenever a glossary CSV changes."""
+    import threading
 
-def main(glossary_name: str, ordering: str) -> None:
-    """Main function."""
-    ui, df_vocab = create_ui(CSS, glossary_name, ordering)
+    from data.loading import open_prepared_glossaries
+    from data.watcher import GlossaryWatcher
 
+    def reload(changed: list[str]) -> None:
+        if storage == STORAGE.SQLITE:
+            # Queued before the deck's reload, so that the grades of the new words come after
+            for name in changed:
+                writer.call(recorders[glossary_names.index(name)].import_glossary)
+            # The deck looks up the sections in the databases, so it is reloaded after them
+            imported = threading.Event()
+            writer.call(imported.set)
+            imported.wait()
+        n_added, n_removed, n_changed = deck.reload(*open_prepared_glossaries(glossary_names))
+        print(f"RELOADED {', '.join(changed)}: {n_added} ADDED, {n_removed} REMOVED, {n_changed} CHANGED WORDS")
+
+    return GlossaryWatcher(glossary_names, reload)
+
+
+def dedup(glossary_names: list[str]) -> None:
+    """Write a report of the near-duplicate candidates of each glossary."""
+    from data.dedup import report_near_duplicates
+    from data.loading import read_glossary_csv
+    for name in glossary_names:
+        report = report_near_duplicates(read_glossary_csv(name), name)
+        if report.empty:
+            print(f"No near-duplicates found in '{name}'.")
+
+
+def import_glossary(args: argparse.Namespace) -> None:
+    """Import a TSV file or an Anki export as a new glossary."""
+    from data.importer import import_deck
+    options = {
+        "fmt": args.format,
+        "fields": args.fields.split(",") if args.fields else None,
+        "section": args.section,
+        "subsection": args.subsection,
+        "chunk_size": args.chunk_size,
+    }
+    import_deck(
+        args.path,
+        args.name,
+        prepare=args.prepare,
+        **{key: value for key, value in options.items() if value is not None},
+    )
+
+
+def print_elapsed(event: str) -> None:
+    print(f"{event} in {1000.0 * (time.perf_counter() - START):.0f} ms")
+
+
+def main(
+    glossary_names: list[str],
+    ordering: str,
+    storage: str = STORAGE.CSV,
+    command: str = UI,
+    foreign_in_front: bool = False,
+    languages: list[str] | None = None,
+    typed: bool = False,
+    timing: bool = False,
+    metrics_path: str | None = None,
+    lean: bool = False,
+    memory_report: bool = False,
+    host: str = "127.0.0.1",
+    port: int = 7861,
+) -> None:
+    """Main function.
+    If `metrics_path` is given, the app is instrumented and its metrics are saved there on exit.
+    If `lean`, the deck is loaded in its memory-lean representation.
+    Translations are shown in `languages`, all of them by default; the UI can switch them.
+    `host` and `port` are only used to serve the review API on its own.
+    """
+    if metrics_path is not None:
+        metrics.enable()
+    assert command in [UI, REVIEW, DEDUP, API], f"Command not recognized: '{command}'"
+    if command == DEDUP:
+        dedup(glossary_names)
+        return
+
+    from components.deck import Deck
+    from data.writer import BackgroundWriter
+    recorders, glossary = open_storage(glossary_names, storage)
+    writer = BackgroundWriter(recorders)
+    deck = Deck(*glossary, recorder=writer, lean=lean)
+    del glossary
+    if storage == STORAGE.SQLITE:
+        deck.section_source = section_word_ids(recorders)
+    watcher = watch_glossaries(deck, glossary_names, storage, recorders, writer)
+    if lean:
+        from utils import release_freed_memory
+        release_freed_memory()
     print_ascii_intro()
-    ui.launch()
+    if memory_report:
+        deck.memory_report()
 
-    df_history = vocab_to_history(df_vocab)
-    save_history(df_history, glossary_name)
+    if command == REVIEW:
+        from terminal import review
+        review(
+            deck,
+            ordering,
+            foreign_in_front,
+            on_first_card=(lambda: print_elapsed("First card")) if timing else None,
+            typed=typed,
+            languages=languages,
+        )
+    elif command == API:
+        from api import serve
+        print(f"Review API on http://{host}:{port}/api/review")
+        serve(deck, host, port)
+    else:
+        from ui import create_ui
+        deck.index_in_background()
+        with open("app/styles.css") as f:
+            css = f.read()
+        ui = create_ui(css, deck, ordering, languages)
+        ui.launch(prevent_thread_lock=True)
+        from api import mount_endpoints
+        mount_endpoints(ui.app, deck)
+        if metrics.is_enabled():
+            metrics.mount_endpoints(ui.app)
+        if timing:
+            print_elapsed("UI ready")
+        ui.block_thread()
 
+    watcher.close()
+    writer.close()
+    close_storage(glossary_names, storage, recorders)
+    if metrics_path is not None:
+        metrics.dump(metrics_path)
     print("Ci vediamo dopo! 👋")
 
 
+def parse_args() -> argparse.Namespace:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-g",
+        "--glossary",
+        nargs="+",
+        default=["glossario"],
+        help="Glossary names, in the glossary folder. Several glossaries are reviewed as one deck",
+    )
+    common.add_argument("-o", "--ordering", choices=ORDERING.ALL, default=ORDERING.NET_ERRORS_WEIGHTED)
+    common.add_argument("-s", "--storage", choices=STORAGE.ALL, default=STORAGE.CSV)
+    common.add_argument(
+        "-l",
+        "--languages",
+        nargs="+",
+        choices=COLUMN.LANGUAGES,
+        help="Languages of the translations (default: all)",
+    )
+    common.add_argument("--timing", action="store_true", help="Print the time until the first card")
+    common.add_argument("--lean", action="store_true", help="Use the memory-lean deck representation")
+    common.add_argument("--memory-report", action="store_true", help="Print the memory used by the deck")
+    common.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="Instrument the app and save its metrics in PATH on exit (Prometheus text if it ends with .prom, JSON otherwise)",
+    )
+
+    parser = argparse.ArgumentParser(description="PTILI: Python Tool per Imparare L'Italiano.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser(UI, parents=[common], help="Review in the Gradio UI (default)")
+    review_parser = subparsers.add_parser(REVIEW, parents=[common], help="Review in the terminal")
+    review_parser.add_argument(
+        "-f",
+        "--foreign-in-front",
+        action="store_true",
+        help="Show the Italian word in front",
+    )
+    review_parser.add_argument(
+        "-t",
+        "--typed",
+        action="store_true",
+        help="Type the answers, which are graded automatically",
+    )
+    subparsers.add_parser(
+        DEDUP,
+        parents=[common],
+        help="Write a report of the near-duplicate words of the glossaries, without changing them",
+    )
+    api_parser = subparsers.add_parser(API, parents=[common], help="Serve the JSON review API on its own")
+    api_parser.add_argument("--host", default="127.0.0.1")
+    api_parser.add_argument("--port", type=int, default=7861)
+    import_parser = subparsers.add_parser(IMPORT, help="Import a TSV file or an Anki export as a new glossary")
+    import_parser.add_argument("path", help="TSV file, with a header, or Anki notes exported as plain text")
+    import_parser.add_argument("-n", "--name", required=True, help="Name of the new glossary")
+    import_parser.add_argument("--format", choices=FORMAT.ALL, help="Detected from the file if not given")
+    import_parser.add_argument(
+        "--fields",
+        help="Column of each field, comma-separated, '-' to skip one (e.g. 'italiano,inglese,-,deck')",
+    )
+    import_parser.add_argument("--section", help="Section of the words without deck (default: the glossary name)")
+    import_parser.add_argument("--subsection", help="Subsection of the words without deck (default: Generale)")
+    import_parser.add_argument("--chunk-size", type=int, help="Rows read at a time (default: 10000)")
+    import_parser.add_argument("--prepare", action="store_true", help="Also write the prepared glossary cache")
+    parser.set_defaults(
+        command=UI,
+        foreign_in_front=False,
+        typed=False,
+        host="127.0.0.1",
+        port=7861,
+        **vars(common.parse_args([])),
+    )
+
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main(glossary_name="glossario", ordering=ORDERING.NET_ERRORS_WEIGHTED)
+    args = parse_args()
+    if args.command == IMPORT:
+        import_glossary(args)
+        raise SystemExit
+    main(
+        glossary_names=args.glossary,
+        ordering=args.ordering,
+        storage=args.storage,
+        command=args.command,
+        foreign_in_front=args.foreign_in_front,
+        languages=args.languages,
+        typed=args.typed,
+        timing=args.timing,
+        metrics_path=args.metrics,
+        lean=args.lean,
+        memory_report=args.memory_report,
+        host=args.host,
+        port=args.port,
+    )
@@ -0,0 +1,239 @@
+"""Opt-in timing spans, latency histograms and counters.
+
+Instrumentation is off by default, in which case spans and timed functions only
+cost a flag check. Once enabled with `enable`, span durations are kept in
+log-linear histograms (about 3% relative error), so that p50/p95/p99 latencies
+can be dumped as JSON or as Prometheus text exposition.
+"""
+
+import json
+import threading
+import time
+from collections.abc import Callable
+from functools import wraps
+from typing import Self
+
+PREFIX = "ptili"
+QUANTILES = [0.5, 0.95, 0.99]
+
+# Histogram buckets keep the SUB_BITS + 1 most significant bits of a duration in ns
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_midpoint(index: int) -> float:
+    if index < SUB_BUCKETS:
+        return float(index)
+    shift = (index >> SUB_BITS) - 1
+    lower = ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << shift
+    return lower + ((1 << shift) - 1) / 2
+
+
+class Histogram:
+    """Log-linear latency histogram of durations in nanoseconds."""
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, value: int) -> None:
+        ix = bucket_index(value)
+        self.buckets[ix] = self.buckets.get(ix, 0) + 1
+        self.min = value if self.count == 0 else min(self.min, value)
+        self.max = max(self.max, value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, qs: list[float]) -> list[float]:
+        """Approximate quantiles of the durations, in nanoseconds."""
+        if self.count == 0:
+            return [0.0 for _ in qs]
+
+        result = []
+        ixs = sorted(self.buckets)
+        q_iter = iter(sorted(qs))
+        q = next(q_iter)
+        cumulative = 0
+        for ix in ixs:
+            cumulative += self.buckets[ix]
+            while q is not None and cumulative >= q * self.count:
+                result.append(min(max(bucket_midpoint(ix), self.min), self.max))
+                q = next(q_iter, None)
+        return result
+
+
+class Registry:
+    """Histograms of spans and counters, shared by all threads."""
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+
+    def observe(self, name: str, value_ns: int) -> None:
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].add(value_ns)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+
+REGISTRY = Registry()
+
+
+def enable() -> None:
+    REGISTRY.enabled = True
+
+
+def disable() -> None:
+    REGISTRY.enabled = False
+
+
+def is_enabled() -> bool:
+    return REGISTRY.enabled
+
+
+# * Spans
+
+
+class Span:
+    """Context manager which times its block."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> Self:
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        REGISTRY.observe(self.name, time.perf_counter_ns() - self.start)
+
+
+class NullSpan:
+    """Span used while instrumentation is off."""
+    __slots__ = ()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name: str) -> Span | NullSpan:
+    """Time a block of code as the span `name`."""
+    return Span(name) if REGISTRY.enabled else NULL_SPAN
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator which times every call of a function as the span `name`."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, n: int = 1) -> None:
+    """Increase the counter `name`."""
+    if REGISTRY.enabled:
+        REGISTRY.count(name, n)
+
+
+# * Exports
+
+
+def to_dict() -> dict:
+    """Spans' latency summaries (in ms) and counters."""
+    with REGISTRY.lock:
+        spans = {}
+        for name, hist in sorted(REGISTRY.histograms.items()):
+            p50, p95, p99 = (v / 1e6 for v in hist.quantiles(QUANTILES))
+            spans[name] = {
+                "count": hist.count,
+                "sum_ms": hist.total / 1e6,
+                "min_ms": hist.min / 1e6,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": hist.max / 1e6,
+            }
+        return {"spans": spans, "counters": dict(sorted(REGISTRY.counters.items()))}
+
+
+def to_json() -> str:
+    return json.dumps(to_dict(), indent=2)
+
+
+def to_prometheus() -> str:
+    """Spans as a summary in seconds and counters, in Prometheus text exposition format."""
+    lines = []
+    with REGISTRY.lock:
+        if REGISTRY.histograms:
+            metric = f"{PREFIX}_span_seconds"
+            lines += [f"# HELP {metric} Duration of the instrumented spans.", f"# TYPE {metric} summary"]
+            for name, hist in sorted(REGISTRY.histograms.items()):
+                for q, v in zip(QUANTILES, hist.quantiles(QUANTILES)):
+                    lines.append(f'{metric}{{span="{name}",quantile="{q}"}} {v / 1e9:.9f}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {hist.total / 1e9:.9f}')
+                lines.append(f'{metric}_count{{span="{name}"}} {hist.count}')
+
+        if REGISTRY.counters:
+            metric = f"{PREFIX}_events_total"
+            lines += [f"# HELP {metric} Number of instrumented events.", f"# TYPE {metric} counter"]
+            for name, value in sorted(REGISTRY.counters.items()):
+                lines.append(f'{metric}{{event="{name}"}} {value}')
+
+    return "\n".join(lines) + "\n"
+
+
+def dump(path: str) -> None:
+    """Dump the metrics to a file, as Prometheus text if it ends with `.prom` and JSON otherwise."""
+    with open(path, "w") as f:
+        f.write(to_prometheus() if path.endswith(".prom") else to_json())
+    print(f"Metrics saved in {path}")
+
+
+def mount_endpoints(app) -> None:
+    """Serve the metrics from a FastAPI app, such as the one of the Gradio UI:
+    Prometheus text at `/metrics` and JSON at `/metrics.json`.
+    """
+    from fastapi.responses import PlainTextResponse
+
+    app.add_api_route(
+        "/metrics",
+        lambda: PlainTextResponse(to_prometheus(), media_type="text/plain; version=0.0.4"),
+        methods=["GET"],
+    )
+    app.add_api_route("/metrics.json", to_dict, methods=["GET"])
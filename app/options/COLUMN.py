@@ -7,4 +7,7 @@ ENGLISH     = "inglese"
 SECTION     = "sezione"
 SUBSECTION  = "sottosezione"
 
-TRANSLATION = "traduzione"  # Concatenation of Spanish and English translations
+TRANSLATION = "traduzione"  # Translations in the selected languages, joined
+WORD_ID     = "parola_id"  # Id of the word's history, optional in the glossary file (hash of the spelling if missing)
+
+LANGUAGES = [SPANISH, ENGLISH]  # Translation columns, in the order they are joined
@@ -0,0 +1,6 @@
+"""Import format options"""
+
+TSV  = "tsv"
+ANKI = "anki"
+
+ALL = [TSV, ANKI]
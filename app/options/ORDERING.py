@@ -4,5 +4,7 @@ RANDOM              = "random"
 ALPHABETIC          = "alphabetic"
 NET_ERRORS          = "net_errors"
 NET_ERRORS_WEIGHTED = "net_errors_weighted"
+PRIORITY_QUEUE      = "priority_queue"
+SPACED_REPETITION   = "spaced_repetition"
 
-ALL = [RANDOM, ALPHABETIC, NET_ERRORS, NET_ERRORS_WEIGHTED]
+ALL = [RANDOM, ALPHABETIC, NET_ERRORS, NET_ERRORS_WEIGHTED, PRIORITY_QUEUE, SPACED_REPETITION]
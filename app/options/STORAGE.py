@@ -0,0 +1,6 @@
+"""Storage backend options"""
+
+CSV    = "csv"
+SQLITE = "sqlite"
+
+ALL = [CSV, SQLITE]
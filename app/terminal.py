@@ -0,0 +1,118 @@
+"""Terminal review script, which does not depend on Gradio."""
+
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from colors import (
+    BOLD,
+    BRIGHT_BLACK,
+    CYAN,
+    GREEN,
+    RED,
+    YELLOW,
+    colored,
+    cprint,
+    make_cprint,
+)
+from components.review_cameriere import ReviewCameriere
+
+if TYPE_CHECKING:
+    from components.deck import Deck
+
+ITA_LABEL = "Italiano"
+TRAD_LABEL = "Traduzione"
+
+# Feedback keys: (is_error, update)
+FEEDBACK = {
+    "i": (False, True),  # Ho indovinato!
+    "p": (False, False),  # Più o meno
+    "s": (True, True),  # Ho sbagliato...
+}
+QUIT = "q"
+ANSWER_PROMPT = "> "
+
+FEEDBACK_PROMPT = (
+    colored(GREEN, "[i]ndovinato")
+    + " / " + colored(YELLOW, "[p]iù o meno")
+    + " / " + colored(RED, "[s]bagliato")
+    + " / [q]uit: "
+)
+
+print_hint = make_cprint(BRIGHT_BLACK)
+
+
+def read_key(prompt: str) -> str:
+    """Read a lowercase answer, with end of input meaning quit."""
+    try:
+        return input(prompt).strip().lower()
+    except (EOFError, KeyboardInterrupt):
+        print()
+        return QUIT
+
+
+def read_feedback() -> str:
+    while (key := read_key(FEEDBACK_PROMPT)) not in FEEDBACK and key != QUIT:
+        print_hint("Risposta non valida.")
+    return key
+
+
+def print_card(label: str, word: str, color: str) -> None:
+    print(f"{colored(BOLD, label)}: {colored(color, word)}")
+
+
+def review_loop(
+    rc: ReviewCameriere,
+    on_first_card: Callable[[], None] | None = None,
+    typed: bool = False,
+) -> None:
+    """Review cards in the terminal until the user quits.
+    If `typed`, the answer is typed and graded automatically; an empty answer
+    shows the solution, to be graded by hand.
+    """
+    trad_label = f"{TRAD_LABEL} ({', '.join(rc.languages)})"
+    front_label, back_label = (ITA_LABEL, trad_label) if rc.foreign_in_front else (trad_label, ITA_LABEL)
+    print_hint(("Scrivi la risposta, " if typed else "") + "Invio per la soluzione, q per uscire.")
+
+    while True:
+        print()
+        print_card(front_label, rc.current_front(), CYAN)
+        if on_first_card is not None:
+            on_first_card()
+            on_first_card = None
+        rc.prefetch()
+        answer = read_key(ANSWER_PROMPT if typed else "")
+        if answer == QUIT:
+            break
+
+        if typed and answer:
+            is_error = not rc.check_answer(answer)
+            print_card(back_label, rc.current_back(), RED if is_error else GREEN)
+            rc.next(is_error=is_error, update=True)
+            continue
+
+        print_card(back_label, rc.current_back(), GREEN)
+        key = read_feedback()
+        if key == QUIT:
+            break
+        is_error, update = FEEDBACK[key]
+        rc.next(is_error=is_error, update=update)
+
+    print()
+    cprint(BOLD, f"Giuste: {rc.n_ok} | Sbagliate: {rc.n_not_ok}")
+
+
+def review(
+    deck: "Deck",
+    ordering: str,
+    foreign_in_front: bool,
+    on_first_card: Callable[[], None] | None = None,
+    typed: bool = False,
+    languages: list[str] | None = None,
+) -> None:
+    """Run a review session in the terminal.
+    `on_first_card` is called once the first card is shown.
+    If `typed`, answers are typed and graded automatically.
+    Translations are shown in `languages`, all of them by default.
+    """
+    rc = ReviewCameriere(deck, ordering=ordering, foreign_in_front=foreign_in_front, languages=languages)
+    review_loop(rc, on_first_card, typed)
@@ -1,23 +1,41 @@
 """Gradio UI script."""
 
+from typing import TYPE_CHECKING
+
 import gradio as gr
 
 from components.buttons import Buttons, create_feedback_buttons
-from components.checkbox_group import create_checkbox_group
-from components.review_cameriere import ReviewCameriere
-from components.states import to_ss_states
-from components.textbox import create_question_textbox
-from data.loading import open_glossary
-
-
-def create_ui(
-    css: str,
-    glossary_name: str,
-    ordering: str,
-) -> gr.Blocks:
-    """Create the Gradio Blocks-based UI."""
-    df_vocab, sections, subsections, sss_counts = open_glossary(glossary_name)
+from components.checkbox_group import create_checkbox_group, set_change_events
+from components.textbox import (
+    create_answer_textbox,
+    create_question_textbox,
+    set_submit_event,
+)
+from components.ui_funcs import (
+    DIRECTIONS,
+    LANGUAGE_FLAGS,
+    deck_version_tick,
+    display_change,
+    prefetch_next,
+    search_input,
+    start_session,
+    stats_show,
+)
+from options import COLUMN
+
+if TYPE_CHECKING:
+    from components.deck import Deck
+    from components.review_cameriere import ReviewCameriere
+
+DECK_POLL_INTERVAL = 2.0  # Seconds between checks for a reload of the deck
+
+
+def create_ui(css: str, deck: "Deck", ordering: str, languages: list[str] | None = None) -> gr.Blocks:
+    """Create the Gradio Blocks-based UI.
+    The deck is shared, while each browser session gets its own ReviewCameriere.
+    """
     foreign_in_front = False
+    languages = languages or COLUMN.LANGUAGES
 
     with gr.Blocks(
         title="PTILI",
@@ -25,15 +43,7 @@ def create_ui(
         css=css,
         theme=gr.themes.Default(primary_hue="green"),
     ) as ui:
-        ss_states = to_ss_states(df_vocab, sections, subsections)
-        rc = ReviewCameriere(
-            df_vocab,
-            sections,
-            subsections,
-            ss_states,
-            ordering=ordering,
-            foreign_in_front=foreign_in_front,
-        )
+        session = gr.State()  # ReviewCameriere
 
         gr.Markdown("# Ptili: Python Tool per Imparare L'Italiano 🇮🇹")
 
@@ -41,23 +51,85 @@ def create_ui(
 
             with gr.Row(visible=True):
                 with gr.Column():
-                    aux = gr.Textbox()
+                    answer = create_answer_textbox()
                 with gr.Column():
-                    card = create_question_textbox(rc, foreign_in_front)
+                    card = create_question_textbox(foreign_in_front)
                 with gr.Column():
                     with gr.Row(visible=True):
                         show_btt = gr.Button("Soluzione", variant="secondary")
                     with gr.Row(visible=True):
                         correct_btt, neutral_btt, wrong_btt = create_feedback_buttons()
 
-        # Gradio Components
-        # sss_comps = glossary_states.to_list()
-
         buttons = Buttons(show_btt, correct_btt, neutral_btt, wrong_btt)
-        buttons.set_click_events(rc, ss_states, card)
+        buttons.set_click_events(session, card)
+        set_submit_event(answer, session, buttons.to_list() + [card])
+
+        with gr.Tab("Cerca"), gr.Column():
+            search_box = gr.Textbox(label="Parola", placeholder="Italiano o traduzione")
+            results = gr.Dataframe(label="Cerca", interactive=False)
+        search_box.input(
+            search_input(deck),
+            inputs=search_box,
+            outputs=results,
+            concurrency_limit=None,
+            trigger_mode="always_last",
+            show_progress="hidden",
+        )
+
+        with gr.Tab("Statistiche") as stats_tab, gr.Column():
+            refresh_btt = gr.Button("Aggiorna", variant="secondary")
+            sections_df = gr.Dataframe(label="Sezioni", interactive=False)
+            subsections_df = gr.Dataframe(label="Sottosezioni", interactive=False)
+            with gr.Row():
+                errors_df = gr.Dataframe(label="Parole più sbagliate", interactive=False)
+                activity_df = gr.Dataframe(label="Attività recente", interactive=False)
+        for event in [stats_tab.select, refresh_btt.click]:
+            event(
+                stats_show(deck),
+                outputs=[sections_df, subsections_df, errors_df, activity_df],
+                concurrency_limit=None,
+            )
 
         with gr.Tab("Impostazioni"):
             with gr.Column():
-                create_checkbox_group(sections, subsections, sss_counts)
+                with gr.Row():
+                    direction = gr.Radio(
+                        DIRECTIONS,
+                        value=DIRECTIONS[foreign_in_front],
+                        type="index",
+                        label="Direzione",
+                    )
+                    language_group = gr.CheckboxGroup(
+                        [(f"{LANGUAGE_FLAGS.get(lang, '')} {lang}".strip(), lang) for lang in COLUMN.LANGUAGES],
+                        value=languages,
+                        label="Lingue (nessuna = tutte)",
+                    )
+                deck_version = gr.State(deck.version)
+
+                @gr.render(inputs=session, triggers=[ui.load, deck_version.change])
+                def render_sections(rc: "ReviewCameriere | None"):
+                    """Section checkboxes, rendered again once the deck is reloaded."""
+                    checkbox_groups = create_checkbox_group(deck, rc)
+                    set_change_events(checkbox_groups, deck.sections, session)
+
+        gr.Timer(DECK_POLL_INTERVAL).tick(
+            deck_version_tick(deck),
+            inputs=deck_version,
+            outputs=deck_version,
+            concurrency_limit=None,
+            show_progress="hidden",
+        )
+        for component in [direction, language_group]:
+            component.change(
+                display_change(),
+                inputs=[session, direction, language_group],
+                outputs=[session] + buttons.to_list() + [card],
+                concurrency_limit=None,
+            ).then(prefetch_next(), inputs=session, concurrency_limit=None)
+
+        ui.load(
+            start_session(deck, ordering, foreign_in_front, languages),
+            outputs=[session, card],
+        ).then(prefetch_next(), inputs=session, concurrency_limit=None)
 
-    return ui, df_vocab
+    return ui
@@ -1,5 +1,7 @@
 """Utils script."""
 
+import ctypes
+import gc
 import os
 import re
 
@@ -26,3 +28,12 @@ def path_is_safe(path: str) -> bool:
             return False
 
     return True
+
+
+def release_freed_memory() -> None:
+    """Return the memory freed by Python to the OS, where the C library allows it (glibc)."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
@@ -0,0 +1 @@
+"""PTILI benchmarks."""
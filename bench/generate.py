@@ -0,0 +1,88 @@
+"""Synthetic glossary and history generator.
+
+Usage: PYTHONPATH=app python3 bench/generate.py <n_rows> [--name NAME] [--history-frac FRAC]
+"""
+
+import argparse
+import datetime as dt
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.loading import GLOSSARY_COLS
+from options import COLUMN
+
+LETTERS = np.array(list("abcdefghilmnoprstuvz"))
+CEFR_LEVELS = np.array(["A1", "A2", "B1", "B2", "C1", "C2"])
+
+
+def random_words(rng: np.random.Generator, n: int, min_len: int = 4, max_len: int = 12) -> np.ndarray:
+    """Random lowercase words, made unique with a numeric suffix."""
+    lens = rng.integers(min_len, max_len + 1, size=n)
+    chars = LETTERS[rng.integers(0, LETTERS.size, size=lens.sum())]
+    words = np.split(chars, np.cumsum(lens)[:-1])
+    return np.array([f"{''.join(w)}{i}" for i, w in enumerate(words)], dtype=object)
+
+
+def generate_glossary(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic glossary with the GLOSSARY_COLS columns.
+    Sections grow sublinearly with the glossary size, with 1 to 8 subsections each.
+    """
+    rng = np.random.default_rng(seed)
+    n_sections = int(np.clip(n_rows ** 0.4, 3, 400))
+    n_subsections = rng.integers(1, 9, size=n_sections)
+
+    s_ids = rng.integers(0, n_sections, size=n_rows)
+    ss_ids = (rng.random(n_rows) * n_subsections[s_ids]).astype(int)
+
+    spanish = random_words(rng, n_rows)
+    english = random_words(rng, n_rows)
+    spanish[rng.random(n_rows) < 0.1] = np.nan
+    english[rng.random(n_rows) < 0.1] = np.nan
+
+    df = pd.DataFrame({
+        COLUMN.ITALIAN: random_words(rng, n_rows),
+        COLUMN.CEFR: CEFR_LEVELS[rng.integers(0, CEFR_LEVELS.size, size=n_rows)],
+        COLUMN.SPANISH: spanish,
+        COLUMN.ENGLISH: english,
+        COLUMN.SECTION: [f"Sezione {s_id:03d}" for s_id in s_ids],
+        COLUMN.SUBSECTION: [f"Sottosezione {ss_id}" for ss_id in ss_ids],
+    })
+    return df[GLOSSARY_COLS]
+
+
+def generate_history(df_glossary: pd.DataFrame, frac: float = 0.3, seed: int = 0) -> pd.DataFrame:
+    """Synthetic history for a fraction of the glossary words."""
+    rng = np.random.default_rng(seed + 1)
+    df = df_glossary[[COLUMN.ITALIAN]].sample(frac=frac, random_state=seed).reset_index(drop=True)
+    n = df.shape[0]
+
+    today = np.datetime64(dt.date.today(), "D")
+    df["ok"] = rng.poisson(3.0, size=n)
+    df["not_ok"] = rng.poisson(1.5, size=n)
+    df["last_ok"] = today - rng.integers(0, 120, size=n).astype("timedelta64[D]")
+    df["last_not_ok"] = today - rng.integers(0, 120, size=n).astype("timedelta64[D]")
+    return df[df[["ok", "not_ok"]].sum(axis=1) > 0]
+
+
+def write_glossary(name: str, n_rows: int, history_frac: float = 0.3, seed: int = 0) -> None:
+    """Write `glossary/<name>.csv` and `history/<name>.csv` in the current directory."""
+    df = generate_glossary(n_rows, seed)
+    os.makedirs("glossary", exist_ok=True)
+    df.to_csv(f"glossary/{name}.csv", index=False, sep=";")
+
+    if history_frac > 0.0:
+        os.makedirs("history", exist_ok=True)
+        generate_history(df, history_frac, seed).to_csv(f"history/{name}.csv", index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic glossary and history.")
+    parser.add_argument("n_rows", type=int)
+    parser.add_argument("--name", default="sintetico")
+    parser.add_argument("--history-frac", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_glossary(args.name, args.n_rows, args.history_frac, args.seed)
@@ -0,0 +1,167 @@
+"""Benchmark suite for the load, ordering, click, grade, search and save paths.
+
+Each benchmark is timed as the best of `--repeat` runs, and its peak of Python
+allocations is measured in a separate run with tracemalloc.
+
+Usage: PYTHONPATH=app python3 bench/run.py [--sizes 1000 10000] [--clicks N] [--json PATH]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+from components.deck import Deck
+from components.rc_utils import RANDOMNESS_SIGMA
+from components.review_cameriere import ReviewCameriere
+from data.loading import open_glossary
+from data.saving import save_history, vocab_to_history
+from data.search import SearchIndex
+from generate import write_glossary
+from options import ORDERING
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+NAME = "bench"
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> tuple[float, float]:
+    """Return the best time in seconds and the peak of allocated bytes of `fn`."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def click_loop(rc: ReviewCameriere, n_clicks: int) -> Callable[[], None]:
+    def fn():
+        for i in range(n_clicks):
+            rc.current_front()
+            rc.current_back()
+            rc.next(is_error=i % 4 == 0, update=True)
+
+    return fn
+
+
+def bench_size(n_rows: int, n_clicks: int, repeat: int) -> list[dict]:
+    results = []
+
+    def add(benchmark: str, fn: Callable[[], Any], per: int = 1) -> None:
+        seconds, peak = measure(fn, repeat)
+        results.append({
+            "rows": n_rows,
+            "benchmark": benchmark,
+            "ms": 1000.0 * seconds / per,
+            "peak_mb": peak / 2 ** 20,
+        })
+
+    write_glossary(NAME, n_rows)
+
+    add("open_glossary (cold)", lambda: open_glossary(NAME, use_cache=False))
+    with contextlib.redirect_stdout(io.StringIO()):
+        df_vocab, sections, subsections, sss_counts = open_glossary(NAME)
+    add("open_glossary (warm)", lambda: open_glossary(NAME))
+
+    add("deck build", lambda: Deck(df_vocab, sections, subsections, sss_counts))
+    add("deck build (lean)", lambda: Deck(df_vocab, sections, subsections, sss_counts, lean=True))
+    deck = Deck(df_vocab, sections, subsections, sss_counts)
+    df_history = deck.store.history_frame()
+
+    from flashcards import (
+        alphabetic_ordering,
+        make_net_weighted_errors_ordering,
+        net_errors_ordering,
+        random_ordering,
+        spaced_repetition_memory,
+    )
+    orderings = {
+        ORDERING.RANDOM: random_ordering,
+        ORDERING.ALPHABETIC: alphabetic_ordering,
+        ORDERING.NET_ERRORS: net_errors_ordering,
+        ORDERING.NET_ERRORS_WEIGHTED: make_net_weighted_errors_ordering(RANDOMNESS_SIGMA),
+    }
+    for ordering, get_order in orderings.items():
+        add(f"ordering {ordering}", lambda get_order=get_order: get_order(df_history))
+    add(
+        f"ordering {ORDERING.SPACED_REPETITION}",
+        lambda: spaced_repetition_memory(df_history, deck.store.last_ok.max()),
+    )
+
+    for ordering in ORDERING.ALL:
+        add(
+            f"session start {ordering}",
+            lambda ordering=ordering: ReviewCameriere(deck, ordering=ordering, foreign_in_front=False),
+        )
+        rc = ReviewCameriere(deck, ordering=ordering, foreign_in_front=False)
+        add(f"click {ordering} (per click)", click_loop(rc, n_clicks), per=n_clicks)
+
+    batch_rows = np.random.default_rng(0).integers(0, n_rows, n_clicks)
+    batch_errors = np.arange(n_clicks) % 4 == 0
+    add("grade batch (per grade)", lambda: deck.grade_many(batch_rows, batch_errors), per=n_clicks)
+
+    add("search index build", lambda: SearchIndex(deck.store.italiano, deck.store.traduzione))
+    search_index = SearchIndex(deck.store.italiano, deck.store.traduzione)
+    word = str(deck.store.italiano[n_rows // 2])
+    queries = [word[:i] for i in range(1, len(word) + 1)]
+    add(
+        "search (per keystroke)",
+        lambda: [search_index.search(query) for query in queries],
+        per=len(queries),
+    )
+
+    add(
+        "vocab_to_history + save_history",
+        lambda: save_history(vocab_to_history(deck.sync_df()), NAME),
+    )
+    return results
+
+
+def print_results(results: list[dict]) -> None:
+    print(f"{'rows':>9}  {'benchmark':<42} {'time (ms)':>12} {'peak (MB)':>10}")
+    for r in results:
+        print(f"{r['rows']:>9}  {r['benchmark']:<42} {r['ms']:>12.4f} {r['peak_mb']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PTILI benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--clicks", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            for n_rows in args.sizes:
+                results += bench_size(n_rows, args.clicks, args.repeat)
+                print_results([r for r in results if r["rows"] == n_rows])
+        finally:
+            os.chdir(cwd)
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+    print(f"Max RSS: {max_rss:.1f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "max_rss_mb": max_rss}, f, indent=2)
@@ -0,0 +1,199 @@
+"""Learner simulation to compare the orderings offline.
+
+A synthetic learner reviews a glossary in one session a day, driven by an ordering
+as in the app: each session computes the ordering from the history counters and
+goes through it. Each word is forgotten along an exponential curve, whose
+stability grows with each recall, the more so the harder the recall was, and
+shrinks with each lapse. An ordering never repeats a word before it is exhausted,
+so the recalls of a whole session are drawn at once, vectorized over its words.
+Learners are spread over a process pool, one task per ordering, parameter and seed.
+
+Usage: PYTHONPATH=app python3 bench/simulate.py [--words N | --glossary NAME] [--learners N]
+       [--days N] [--cards N] [--sigmas 0.1 0.33 1.0] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from components.rc_utils import RANDOMNESS_SIGMA, load_ordering
+from options import COLUMN, ORDERING
+
+# Orderings driven by the history counters alone, so each session is a single queue
+ORDERINGS = [ORDERING.RANDOM, ORDERING.ALPHABETIC, ORDERING.NET_ERRORS, ORDERING.NET_ERRORS_WEIGHTED]
+METRICS = ["retention", "retention_seen", "coverage", "mastered", "accuracy"]
+
+# Learner model
+PRIOR_LOGIT = -1.5  # Words never reviewed are recalled ~18% of the times
+DIFFICULTY_SIGMA = 1.0
+LENGTH_DIFFICULTY = 0.1  # Per character longer than the average word
+INITIAL_STABILITY = 1.0  # Days
+GROWTH = 2.5
+LAPSE_FACTOR = 0.3
+SESSION_LENGTH = 1 / 48  # Days, so that a word seen twice in a session is still fresh
+MASTERED_RECALL = 0.9
+
+
+class Learner:
+    """Memory of a synthetic learner: the stability (in days) and last review
+    time of each word, and how hard each word is for them.
+    """
+    def __init__(self, difficulty: np.ndarray):
+        self.difficulty = difficulty
+        self.ease = np.exp(-difficulty)
+        self.prior = 1 / (1 + np.exp(difficulty - PRIOR_LOGIT))
+        self.seen = np.zeros(difficulty.size, dtype=bool)
+        self.stability = np.full(difficulty.size, INITIAL_STABILITY)
+        self.last_review = np.zeros(difficulty.size)
+
+    def recall_probability(self, rows: np.ndarray, now: np.ndarray | float) -> np.ndarray:
+        """Words are forgotten down to what the learner knew before reviewing them."""
+        prior = self.prior[rows]
+        forgetting = np.exp(-(now - self.last_review[rows]) / self.stability[rows])
+        return np.where(self.seen[rows], prior + (1 - prior) * forgetting, prior)
+
+    def review(self, rows: np.ndarray, now: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Review distinct words at the given times and return whether each was recalled.
+        The answer is shown either way, so a word is learned once first reviewed.
+        """
+        p = self.recall_probability(rows, now)
+        is_ok = rng.random(rows.size) < p
+
+        ease, stability, first = self.ease[rows], self.stability[rows], ~self.seen[rows]
+        stability_ok = np.where(
+            first,
+            INITIAL_STABILITY * ease * (1 + GROWTH),
+            stability * (1 + GROWTH * ease * (1 - p)),
+        )
+        stability_lapse = np.maximum(np.where(first, 0.0, stability * LAPSE_FACTOR), INITIAL_STABILITY * ease)
+
+        self.stability[rows] = np.where(is_ok, stability_ok, stability_lapse)
+        self.last_review[rows] = now
+        self.seen[rows] = True
+        return is_ok
+
+
+def word_difficulty(lengths: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Random difficulty of each word, higher for longer words."""
+    return rng.normal(0.0, DIFFICULTY_SIGMA, lengths.size) + LENGTH_DIFFICULTY * (lengths - lengths.mean())
+
+
+def simulate_learner(
+    ordering: str,
+    randomness_sigma: float,
+    lengths: np.ndarray,
+    n_days: int,
+    n_cards: int,
+    seed: int,
+) -> dict[str, float]:
+    """Simulate a learner reviewing `n_cards` words a day for `n_days` days, and
+    return their metrics on the next day.
+    """
+    rng = np.random.default_rng(seed)
+    np.random.seed(seed)  # The orderings draw from the global generator
+    learner = Learner(word_difficulty(lengths, rng))
+    get_order = load_ordering(ordering, randomness_sigma)
+    ok = np.zeros(lengths.size, dtype=np.int64)
+    not_ok = np.zeros(lengths.size, dtype=np.int64)
+
+    for day in range(n_days):
+        n_done = 0
+        while n_done < n_cards:
+            rows = np.asarray(get_order(pd.DataFrame({"ok": ok, "not_ok": not_ok})))[:n_cards - n_done]
+            now = day + (n_done + np.arange(rows.size)) * SESSION_LENGTH / n_cards
+            is_ok = learner.review(rows, now, rng)
+            ok[rows] += is_ok
+            not_ok[rows] += ~is_ok
+            n_done += rows.size
+
+    recall = learner.recall_probability(np.arange(lengths.size), float(n_days))
+    return {
+        "retention": float(recall.mean()),
+        "retention_seen": float(recall[learner.seen].mean()) if learner.seen.any() else 0.0,
+        "coverage": float(learner.seen.mean()),
+        "mastered": float((recall >= MASTERED_RECALL).mean()),
+        "accuracy": float(ok.sum() / max(ok.sum() + not_ok.sum(), 1)),
+    }
+
+
+def run_task(task: tuple) -> tuple[str, float, dict[str, float]]:
+    ordering, randomness_sigma, *args = task
+    return ordering, randomness_sigma, simulate_learner(ordering, randomness_sigma, *args)
+
+
+def simulate(
+    lengths: np.ndarray,
+    n_learners: int,
+    n_days: int,
+    n_cards: int,
+    sigmas: list[float],
+    n_workers: int | None = None,
+) -> list[dict]:
+    """Mean and standard deviation of the metrics of each ordering, over `n_learners`
+    learners, with each randomness sigma for the weighted net errors ordering.
+    Learners with the same seed have the same word difficulties in every ordering.
+    """
+    configs = [(ordering, RANDOMNESS_SIGMA) for ordering in ORDERINGS if ordering != ORDERING.NET_ERRORS_WEIGHTED]
+    configs += [(ORDERING.NET_ERRORS_WEIGHTED, sigma) for sigma in sigmas]
+    tasks = [(*config, lengths, n_days, n_cards, seed) for config in configs for seed in range(n_learners)]
+
+    n_workers = n_workers or os.cpu_count() or 1
+    runs: dict[tuple[str, float], list[dict[str, float]]] = {config: [] for config in configs}
+    with ProcessPoolExecutor(n_workers) as pool:
+        for ordering, sigma, metrics in pool.map(run_task, tasks, chunksize=max(len(tasks) // (4 * n_workers), 1)):
+            runs[(ordering, sigma)].append(metrics)
+
+    results = []
+    for (ordering, sigma), metrics in runs.items():
+        result = {"ordering": ordering, "sigma": sigma if ordering == ORDERING.NET_ERRORS_WEIGHTED else None}
+        for metric in METRICS:
+            values = np.array([m[metric] for m in metrics])
+            result[metric] = float(values.mean())
+            result[f"{metric}_std"] = float(values.std())
+        results.append(result)
+    return results
+
+
+def print_results(results: list[dict]) -> None:
+    print(f"{'ordering':<22} {'sigma':>6}" + "".join(f" {metric:>16}" for metric in METRICS))
+    for r in results:
+        sigma = "" if r["sigma"] is None else f"{r['sigma']:.2f}"
+        print(f"{r['ordering']:<22} {sigma:>6}" + "".join(
+            f" {r[metric]:>9.3f} ±{r[f'{metric}_std']:.3f}" for metric in METRICS
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the PTILI orderings on simulated learners.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--words", type=int, default=2000, help="Size of a synthetic glossary")
+    source.add_argument("--glossary", help="Glossary name, in the glossary folder, to take the words from")
+    parser.add_argument("--learners", type=int, default=20, help="Learners per ordering and parameter")
+    parser.add_argument("--days", type=int, default=60, help="Sessions per learner, one a day")
+    parser.add_argument("--cards", type=int, default=100, help="Cards reviewed per session")
+    parser.add_argument("--sigmas", type=float, nargs="+", default=[RANDOMNESS_SIGMA])
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.glossary:
+        from data.loading import read_glossary_csv
+        lengths = read_glossary_csv(args.glossary)[COLUMN.ITALIAN].astype(str).str.len().to_numpy()
+    else:
+        lengths = np.random.default_rng(0).integers(4, 13, args.words)
+
+    start = time.perf_counter()
+    results = simulate(lengths, args.learners, args.days, args.cards, args.sigmas, args.workers)
+    elapsed = time.perf_counter() - start
+    print_results(results)
+    n_sessions = len(results) * args.learners * args.days
+    print(f"{n_sessions} sessions simulated in {elapsed:.1f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "seconds": elapsed}, f, indent=2)
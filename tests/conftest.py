@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app modules import each other as top-level modules, as when running app/main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
@@ -0,0 +1,52 @@
+import pytest
+
+import api
+from api import SessionRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(api.time, "monotonic", clock)
+    return clock
+
+
+def test_idle_sessions_expire(clock):
+    sessions = SessionRegistry(ttl=10, max_sessions=100)
+    idle_id = sessions.add(object())
+    active_id = sessions.add(object())
+    clock.now = 8
+    assert sessions.get(active_id) is not None
+    clock.now = 15
+    assert sessions.get(idle_id) is None
+    assert sessions.get(active_id) is not None
+    assert len(sessions) == 1
+
+
+def test_least_recently_used_sessions_are_closed(clock):
+    sessions = SessionRegistry(ttl=10, max_sessions=2)
+    first_id = sessions.add(object())
+    second_id = sessions.add(object())
+    clock.now = 1
+    sessions.get(first_id)
+    third_id = sessions.add(object())
+    assert sessions.get(second_id) is None
+    assert sessions.get(first_id) is not None
+    assert sessions.get(third_id) is not None
+
+
+def test_closed_session_is_gone(clock):
+    sessions = SessionRegistry()
+    session = object()
+    session_id = sessions.add(session)
+    assert sessions.pop(session_id) is session
+    assert sessions.pop(session_id) is None
+    assert len(sessions) == 0
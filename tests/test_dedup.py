@@ -0,0 +1,25 @@
+import pandas as pd
+
+from data.dedup import find_near_duplicates
+from options import COLUMN
+
+
+def glossary(words: list[str]) -> pd.DataFrame:
+    return pd.DataFrame({
+        COLUMN.ITALIAN: words,
+        COLUMN.SECTION: "Sezione",
+        COLUMN.SUBSECTION: "Sottosezione",
+    })
+
+
+def test_same_form_is_reported_against_the_first_word():
+    report = find_near_duplicates(glossary(["perché", "Perche", "il perché", "perche", "casa"]))
+    same_form = report[report["motivo"] == "normalizzata"]
+    assert same_form[f"{COLUMN.ITALIAN}_1"].tolist() == ["perché"] * 3
+    assert same_form[f"{COLUMN.ITALIAN}_2"].tolist() == ["Perche", "il perché", "perche"]
+
+
+def test_similar_forms_are_reported_once():
+    report = find_near_duplicates(glossary(["la macchina", "macchina", "macchine", "Macchine"] + 50 * ["macchine"]))
+    similar = report[report["motivo"] == "simile"]
+    assert similar[[f"{COLUMN.ITALIAN}_1", f"{COLUMN.ITALIAN}_2"]].values.tolist() == [["la macchina", "macchine"]]
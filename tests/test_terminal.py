@@ -0,0 +1,55 @@
+import terminal
+
+
+class FakeCameriere:
+    """Session stub which records the grades it gets."""
+    def __init__(self):
+        self.languages = ["inglese"]
+        self.foreign_in_front = False
+        self.n_ok = 0
+        self.n_not_ok = 0
+        self.checked: list[str] = []
+        self.grades: list[tuple[bool, bool]] = []
+
+    def current_front(self) -> str:
+        return "house"
+
+    def current_back(self) -> str:
+        return "casa"
+
+    def prefetch(self) -> None:
+        pass
+
+    def check_answer(self, typed: str) -> bool:
+        self.checked.append(typed)
+        return typed == "casa"
+
+    def next(self, is_error: bool, update: bool) -> list:
+        self.grades.append((is_error, update))
+        return []
+
+
+def review_with_inputs(monkeypatch, inputs: list[str], typed: bool) -> FakeCameriere:
+    keys = iter(inputs)
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(keys))
+    rc = FakeCameriere()
+    terminal.review_loop(rc, typed=typed)
+    return rc
+
+
+def test_untyped_input_only_shows_the_solution(monkeypatch):
+    rc = review_with_inputs(monkeypatch, ["foo", "i", "q"], typed=False)
+    assert rc.checked == []
+    assert rc.grades == [(False, True)]
+
+
+def test_typed_answer_is_graded(monkeypatch):
+    rc = review_with_inputs(monkeypatch, ["cosa", "casa", "q"], typed=True)
+    assert rc.checked == ["cosa", "casa"]
+    assert rc.grades == [(True, True), (False, True)]
+
+
+def test_typed_empty_answer_is_graded_by_hand(monkeypatch):
+    rc = review_with_inputs(monkeypatch, ["", "s", "q"], typed=True)
+    assert rc.checked == []
+    assert rc.grades == [(True, True)]
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from data.utils import get_sss_ids, get_sss_starts
+from options import COLUMN
+
+
+def test_empty_subsections_are_one_subsection():
+    df = pd.DataFrame({
+        COLUMN.SECTION: ["Casa", "Casa", "Casa", "Cibo", "Cibo", "Cibo"],
+        COLUMN.SUBSECTION: ["Cucina", np.nan, np.nan, "Frutta", np.nan, np.nan],
+    })
+    s_starts, ss_starts = get_sss_starts(df)
+    assert s_starts.tolist() == [0, 3]
+    assert ss_starts.tolist() == [0, 1, 3, 4]
+
+    _, ss_ids, sss_counts = get_sss_ids(df.shape[0], s_starts, ss_starts)
+    assert ss_ids.tolist() == [0, 1, 1, 0, 1, 1]
+    assert sss_counts == [[1, 2], [1, 2]]